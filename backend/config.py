@@ -1,42 +1,40 @@
 import os
+from functools import lru_cache
 from pathlib import Path
-from dotenv import load_dotenv, find_dotenv
-
-# どのカレントディレクトリから実行しても .env を確実に読み込む
-# 優先順: backend/.env → プロジェクトルート/.env → カレントディレクトリから探索
-_backend_dir_path = Path(__file__).resolve().parent
-_backend_env = _backend_dir_path / ".env"
-_project_root = Path(__file__).resolve().parents[1]
-_project_env = _project_root / ".env"
-
-if _backend_env.exists():
-    load_dotenv(_backend_env, override=False)
-elif _project_env.exists():
-    load_dotenv(_project_env, override=False)
-else:
-    load_dotenv(find_dotenv(usecwd=True), override=False)
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Optional, Tuple
+from dotenv import load_dotenv, find_dotenv, dotenv_values
 
 # backend ディレクトリ（このファイルの場所）を基準に相対パスを絶対化するための基準パス
 _backend_dir = Path(__file__).resolve().parent
 
-class Config:
-    # === Gemini API設定 ===
-    GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-    GEMINI_CHAT_MODEL = os.getenv("GEMINI_CHAT_MODEL", "gemini-1.5-flash")
-    GEMINI_EMBEDDING_MODEL = os.getenv("GEMINI_EMBEDDING_MODEL", "models/text-embedding-004")
-    RAG_TOP_K = int(os.getenv("RAG_TOP_K", "6"))
-    RAG_CHUNK_SIZE = int(os.getenv("RAG_CHUNK_SIZE", "1200"))
-    RAG_CHUNK_OVERLAP = int(os.getenv("RAG_CHUNK_OVERLAP", "200"))
-    # 近傍探索の手法と再ランキング関連
-    RAG_USE_MMR = os.getenv("RAG_USE_MMR", "true").lower() == "true"
-    RAG_MMR_DIVERSITY = float(os.getenv("RAG_MMR_DIVERSITY", "0.3"))
-    RAG_CANDIDATE_K = int(os.getenv("RAG_CANDIDATE_K", "20"))
-    # 生成時のコンテキスト制約
-    RAG_MAX_CONTEXT_TOKENS = int(os.getenv("RAG_MAX_CONTEXT_TOKENS", "4000"))
-    RAG_SYSTEM_INSTRUCTIONS = os.getenv(
-        "RAG_SYSTEM_INSTRUCTIONS",
-        (
-            """
+
+@lru_cache(maxsize=None)
+def load_env_once() -> Dict[str, Optional[str]]:
+    """.env をプロセス内で一度だけ読み込み、その内容を返す。
+
+    どのカレントディレクトリから実行しても .env を確実に読み込む。
+    優先順: backend/.env → プロジェクトルート/.env → カレントディレクトリから探索
+    """
+    backend_env = _backend_dir / ".env"
+    project_env = _backend_dir.parent / ".env"
+
+    if backend_env.exists():
+        env_path = str(backend_env)
+    elif project_env.exists():
+        env_path = str(project_env)
+    else:
+        env_path = find_dotenv(usecwd=True)
+
+    if not env_path:
+        return {}
+    load_dotenv(env_path, override=False)
+    return dotenv_values(env_path)
+
+
+load_env_once()
+
+_DEFAULT_SYSTEM_INSTRUCTIONS = """
 あなたは営業活動を支援する専門のRAGアシスタントです。架電リストの企業データベースから最適な情報を抽出し、営業戦略の立案を支援してください。
 
 【回答の方針】
@@ -60,22 +58,122 @@ class Config:
 
 コンテキストに関連情報がない場合のみ「該当する企業情報は見つかりませんでした」と回答してください。
 """
-        ),
-    )
-    
+
+
+@dataclass(frozen=True)
+class Config:
+    """アプリケーション設定。値はインポート時に一度だけ環境変数から解決され、以後は不変。"""
+
+    # === Gemini API設定 ===
+    GEMINI_API_KEY: Optional[str]
+    GEMINI_CHAT_MODEL: str
+    GEMINI_EMBEDDING_MODEL: str
+    # 埋め込みプロバイダ（"gemini" または ローカル推論の "onnx"）
+    RAG_EMBEDDING_PROVIDER: str
+    RAG_LOCAL_EMBEDDING_MODEL: str
+    RAG_TOP_K: int
+    RAG_CHUNK_SIZE: int
+    RAG_CHUNK_OVERLAP: int
+    # /ingest で1回の埋め込み呼び出し・Chroma への1回の登録にまとめるチャンク数
+    RAG_INGEST_BATCH_SIZE: int
+    # /ingest で同時に計算する埋め込みバッチ数（ファイルをまたいで RAG_INGEST_BATCH_SIZE × この数のチャンクを溜めてから処理する）
+    RAG_INGEST_CONCURRENCY: int
+    # /ingest でファイルの読み込み・分割に使うプロセス数（0 ならプロセス内のスレッドで行う）
+    RAG_INGEST_WORKERS: int
+    # 近傍探索の手法と再ランキング関連
+    RAG_USE_MMR: bool
+    RAG_MMR_DIVERSITY: float
+    RAG_CANDIDATE_K: int
+    # 2段階検索: RAG_CANDIDATE_K 件の候補を再ランキングし、上位 RAG_RERANK_TOP_N 件を LLM に渡す
+    RAG_USE_RERANKER: bool
+    RAG_RERANK_TOP_N: int
+    RAG_RERANKER_MODEL: str
+    # 生成時のコンテキスト制約
+    RAG_MAX_CONTEXT_TOKENS: int
+    RAG_SYSTEM_INSTRUCTIONS: str
+    # 質問文の最大文字数と、LLM を呼ぶチャット系リクエストの同時実行数の上限
+    RAG_MAX_QUERY_LENGTH: int
+    RAG_MAX_CONCURRENT_CHATS: int
+
     # === サーバー設定 ===
-    BACKEND_PORT = int(os.getenv("BACKEND_PORT", "8000"))
-    
+    BACKEND_PORT: int
+
     # === ファイル設定 ===
-    # 相対パスが与えられた場合でも、常に backend ディレクトリ基準で絶対パス化する
-    DATA_DIR = os.getenv("DATA_DIR", str((_backend_dir / "data/docs").resolve()))
-    CHROMA_STORE_DIR = os.getenv("CHROMA_STORE_DIR", str((_backend_dir / "chroma_store").resolve()))
-    
+    DATA_DIR: str
+    CHROMA_STORE_DIR: str
+
     # === 許可された拡張子 ===
-    ALLOWED_EXTENSIONS = {".pdf", ".md", ".txt", ".markdown", ".csv", ".xlsx", ".tsv"}
+    ALLOWED_EXTENSIONS: FrozenSet[str]
 
     # === スプレッドシート取り込み設定 ===
-    # 読み込む列を指定（例: "title,body,notes"）。空なら全列を読み込む。
-    SPREADSHEET_TEXT_COLUMNS = os.getenv("SPREADSHEET_TEXT_COLUMNS", "企業名,代表電話,直通番号,社内メモ,従業員数,架電者,リードステータス,架電ログ")
-    # 区切り文字（CSV=`,`、TSV=`\t`）
-    SPREADSHEET_DELIMITER = os.getenv("SPREADSHEET_DELIMITER", ",")
+    SPREADSHEET_TEXT_COLUMNS: str
+    # SPREADSHEET_TEXT_COLUMNS を分割済みのタプルにしたもの（空なら全列）
+    SPREADSHEET_TEXT_COLUMNS_TUPLE: Tuple[str, ...]
+    SPREADSHEET_DELIMITER: str
+
+
+_FALSE_VALUES = frozenset({"0", "false", "no", "off", ""})
+
+
+def _env_bool(env_name: str, default: str) -> bool:
+    return os.getenv(env_name, default).strip().lower() not in _FALSE_VALUES
+
+
+def _resolve_dir(env_name: str, default: str) -> str:
+    """相対パスが与えられた場合でも、常に backend ディレクトリ基準で絶対パス化した文字列を返す"""
+    path = Path(os.getenv(env_name) or default)
+    if not path.is_absolute():
+        path = _backend_dir / path
+    return str(path.resolve())
+
+
+def _parse_env() -> Dict[str, Any]:
+    text_columns = os.getenv("SPREADSHEET_TEXT_COLUMNS", "企業名,代表電話,直通番号,社内メモ,従業員数,架電者,リードステータス,架電ログ")
+    return {
+        "GEMINI_API_KEY": os.getenv("GEMINI_API_KEY"),
+        # 旧設定名 GEMINI_MODEL も受け付ける
+        "GEMINI_CHAT_MODEL": os.getenv("GEMINI_CHAT_MODEL") or os.getenv("GEMINI_MODEL") or "gemini-1.5-flash",
+        "GEMINI_EMBEDDING_MODEL": os.getenv("GEMINI_EMBEDDING_MODEL", "models/text-embedding-004"),
+        "RAG_EMBEDDING_PROVIDER": os.getenv("RAG_EMBEDDING_PROVIDER", "gemini").strip().lower(),
+        "RAG_LOCAL_EMBEDDING_MODEL": os.getenv("RAG_LOCAL_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"),
+        "RAG_TOP_K": int(os.getenv("RAG_TOP_K", "5")),
+        "RAG_CHUNK_SIZE": int(os.getenv("RAG_CHUNK_SIZE", "600")),
+        "RAG_CHUNK_OVERLAP": int(os.getenv("RAG_CHUNK_OVERLAP", "0")),
+        "RAG_INGEST_BATCH_SIZE": max(1, int(os.getenv("RAG_INGEST_BATCH_SIZE", "200"))),
+        "RAG_INGEST_CONCURRENCY": max(1, int(os.getenv("RAG_INGEST_CONCURRENCY", str(min(16, os.cpu_count() or 1))))),
+        "RAG_INGEST_WORKERS": max(0, int(os.getenv("RAG_INGEST_WORKERS", "0"))),
+        "RAG_USE_MMR": _env_bool("RAG_USE_MMR", "true"),
+        "RAG_MMR_DIVERSITY": float(os.getenv("RAG_MMR_DIVERSITY", "0.3")),
+        "RAG_CANDIDATE_K": int(os.getenv("RAG_CANDIDATE_K", "50")),
+        "RAG_USE_RERANKER": _env_bool("RAG_USE_RERANKER", "false"),
+        "RAG_RERANK_TOP_N": int(os.getenv("RAG_RERANK_TOP_N", "10")),
+        "RAG_RERANKER_MODEL": os.getenv("RAG_RERANKER_MODEL", "BAAI/bge-reranker-base"),
+        "RAG_MAX_CONTEXT_TOKENS": int(os.getenv("RAG_MAX_CONTEXT_TOKENS", "2500")),
+        # 毎リクエストで整形しないよう、前後の空白はここで一度だけ除去する
+        "RAG_SYSTEM_INSTRUCTIONS": os.getenv("RAG_SYSTEM_INSTRUCTIONS", _DEFAULT_SYSTEM_INSTRUCTIONS).strip(),
+        "RAG_MAX_QUERY_LENGTH": int(os.getenv("RAG_MAX_QUERY_LENGTH", "2000")),
+        "RAG_MAX_CONCURRENT_CHATS": int(os.getenv("RAG_MAX_CONCURRENT_CHATS", "8")),
+        "BACKEND_PORT": int(os.getenv("BACKEND_PORT", "8000")),
+        # パスはここで一度だけ解決し、以降は文字列のまま使う
+        "DATA_DIR": _resolve_dir("DATA_DIR", "data/docs"),
+        "CHROMA_STORE_DIR": _resolve_dir("CHROMA_STORE_DIR", "chroma_store"),
+        "ALLOWED_EXTENSIONS": frozenset({".pdf", ".md", ".txt", ".markdown", ".csv", ".xlsx", ".tsv"}),
+        # 読み込む列を指定（例: "title,body,notes"）。空なら全列を読み込む。
+        "SPREADSHEET_TEXT_COLUMNS": text_columns,
+        "SPREADSHEET_TEXT_COLUMNS_TUPLE": tuple(c.strip() for c in text_columns.split(",") if c.strip()),
+        # 区切り文字（CSV=`,`、TSV=`\t`）
+        "SPREADSHEET_DELIMITER": os.getenv("SPREADSHEET_DELIMITER", ","),
+    }
+
+
+# プロセス全体で共有する設定インスタンス
+CONFIG = Config(**_parse_env())
+
+# "leads" コレクションの HNSW インデックス設定（Chroma は hnswlib を内部で使用）。
+# コレクション作成時にのみ反映されるため、既存ストアへ適用するには再インジェストが必要。
+# hnsw:space は既定の l2 のまま（スコア閾値が距離尺度に依存するため変更しない）。
+LEADS_COLLECTION_METADATA: Dict[str, Any] = {
+    "hnsw:M": 32,
+    "hnsw:construction_ef": 200,
+    "hnsw:search_ef": 64,
+}
@@ -1,13 +1,64 @@
+import asyncio
+import atexit
+import hashlib
+import logging
 import os
-from typing import List
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional
 import httpx
+import ijson
+import msgspec
+import numpy as np
+import orjson
+
+from config import CONFIG
+from utils.async_utils import run_sync
 
 GEMINI_EMBED_ENDPOINT = "https://generativelanguage.googleapis.com/v1beta/models/text-embedding-004:embedContent"
+GEMINI_BATCH_EMBED_ENDPOINT = "https://generativelanguage.googleapis.com/v1beta/models/text-embedding-004:batchEmbedContents"
+GEMINI_EMBED_MODEL = "models/text-embedding-004"
+# batchEmbedContents の1リクエストあたりの上限
+GEMINI_BATCH_SIZE = 100
+# バッチの同時送信数と 429 時の最大試行回数
+GEMINI_EMBED_CONCURRENCY = 8
+GEMINI_MAX_RETRIES = 3
+# 並行して届いたクエリ埋め込みをまとめる待ち時間（秒）と1回あたりの最大件数
+QUERY_BATCH_WAIT_SECONDS = 0.01
+QUERY_BATCH_MAX_SIZE = 32
+
+# 呼び出しごとの TCP/TLS ハンドシェイクを避けるため、プロセス内で接続を使い回す
+_CLIENT = httpx.Client(
+    http2=True,
+    timeout=httpx.Timeout(30.0, connect=5.0),
+    limits=httpx.Limits(max_keepalive_connections=20, max_connections=40),
+)
+atexit.register(_CLIENT.close)
+
+logger = logging.getLogger(__name__)
 
 class GeminiEmbeddingError(Exception):
     pass
 
 
+class _Embedding(msgspec.Struct):
+    values: List[float] = []
+    value: List[float] = []
+
+
+class _EmbedResponse(msgspec.Struct):
+    embedding: _Embedding
+
+
+# embedContent のレスポンスを型付きで直接デコードする（形が不正なら DecodeError）
+_EMBED_RESPONSE_DECODER = msgspec.json.Decoder(_EmbedResponse)
+
+
 def _get_api_key() -> str:
     key = os.getenv("GEMINI_API_KEY")
     if not key:
@@ -15,42 +66,368 @@ def _get_api_key() -> str:
     return key
 
 
-def embed_content(text: str) -> List[float]:
-    """Call Gemini Embeddings API (text-embedding-004:embedContent)."""
-    api_key = _get_api_key()
-    headers = {
+@lru_cache(maxsize=1)
+def _get_headers() -> Dict[str, str]:
+    """リクエストヘッダはプロセス内で一度だけ組み立てて使い回す（キー未設定時は例外でキャッシュしない）"""
+    return {
         "Content-Type": "application/json",
-        "x-goog-api-key": api_key,
+        "x-goog-api-key": _get_api_key(),
     }
+
+
+def embed_content(text: str) -> List[float]:
+    """Call Gemini Embeddings API (text-embedding-004:embedContent)."""
+    headers = _get_headers()
     payload = {
-        "model": "models/text-embedding-004",
+        "model": GEMINI_EMBED_MODEL,
         "content": {
             "parts": [{"text": text}]
         },
     }
 
     try:
-        with httpx.Client(timeout=30.0) as client:
-            resp = client.post(GEMINI_EMBED_ENDPOINT, headers=headers, json=payload)
-            if resp.status_code != 200:
-                raise GeminiEmbeddingError(
-                    f"Gemini embed error: {resp.status_code} {resp.text}"
-                )
-            data = resp.json()
-            embedding = (data.get("embedding") or {})
-            values = embedding.get("values") or embedding.get("value")
+        for attempt in range(GEMINI_MAX_RETRIES):
+            resp = _CLIENT.post(GEMINI_EMBED_ENDPOINT, headers=headers, content=orjson.dumps(payload))
+            if not _should_retry(resp.status_code, attempt):
+                break
+            time.sleep(_retry_delay(attempt))
+        if resp.status_code != 200:
+            raise GeminiEmbeddingError(
+                f"Gemini embed error: {resp.status_code} {resp.text}"
+            )
+        try:
+            embedding = _EMBED_RESPONSE_DECODER.decode(resp.content).embedding
+        except msgspec.DecodeError as e:
+            raise GeminiEmbeddingError(f"Invalid embedding response shape: {e}") from e
+        values = embedding.values or embedding.value
+        if not values:
+            raise GeminiEmbeddingError("Invalid embedding response shape")
+        return values
+    except httpx.HTTPError as e:
+        raise GeminiEmbeddingError(f"HTTP error: {e}") from e
+
+
+def _batch_payload(batch: List[str]) -> Dict[str, Any]:
+    return {
+        "requests": [
+            {
+                "model": GEMINI_EMBED_MODEL,
+                "content": {"parts": [{"text": t}]},
+            }
+            for t in batch
+        ]
+    }
+
+
+class _BatchStreamParser:
+    """batchEmbedContents のレスポンスを受信しながら embeddings[].values を逐次取り出す。
+
+    レスポンス全体のバイト列や中間の dict を保持しないため、大きなバッチでもピークメモリを抑えられる。
+    """
+
+    def __init__(self, expected: int):
+        self.expected = expected
+        self.results: List[List[float]] = []
+        self._events = ijson.sendable_list()
+        self._coro = ijson.items_coro(self._events, "embeddings.item.values", use_float=True)
+
+    def feed(self, chunk: bytes) -> None:
+        try:
+            self._coro.send(chunk)
+        except ijson.JSONError as e:
+            raise GeminiEmbeddingError(f"Invalid batch embedding response: {e}") from e
+        self._collect()
+
+    def close(self) -> List[List[float]]:
+        try:
+            self._coro.close()
+        except ijson.JSONError as e:
+            raise GeminiEmbeddingError(f"Invalid batch embedding response: {e}") from e
+        self._collect()
+        if len(self.results) != self.expected:
+            raise GeminiEmbeddingError("Invalid batch embedding response shape")
+        return self.results
+
+    def _collect(self) -> None:
+        for values in self._events:
             if not isinstance(values, list):
                 raise GeminiEmbeddingError("Invalid embedding response shape")
-            return values  # type: ignore[return-value]
+            self.results.append(values)
+        del self._events[:]
+
+
+def _batch_error(resp: httpx.Response) -> GeminiEmbeddingError:
+    return GeminiEmbeddingError(f"Gemini batch embed error: {resp.status_code} {resp.text}")
+
+
+def _should_retry(status_code: int, attempt: int) -> bool:
+    """レート制限（429）で、試行回数が残っていれば再試行する"""
+    return status_code == 429 and attempt < GEMINI_MAX_RETRIES - 1
+
+
+def _retry_delay(attempt: int) -> float:
+    """再試行までの待ち時間（指数バックオフ＋ジッター、秒）"""
+    return (2 ** attempt) + random.uniform(0, 1)
+
+
+def _embed_batch(headers: Dict[str, str], batch: List[str]) -> List[List[float]]:
+    for attempt in range(GEMINI_MAX_RETRIES):
+        with _CLIENT.stream(
+            "POST", GEMINI_BATCH_EMBED_ENDPOINT, headers=headers, content=orjson.dumps(_batch_payload(batch))
+        ) as resp:
+            if resp.status_code == 200:
+                parser = _BatchStreamParser(len(batch))
+                for chunk in resp.iter_bytes():
+                    parser.feed(chunk)
+                return parser.close()
+            resp.read()
+            if not _should_retry(resp.status_code, attempt):
+                raise _batch_error(resp)
+        time.sleep(_retry_delay(attempt))
+    raise GeminiEmbeddingError("Gemini batch embed error: retries exhausted")
+
+
+async def _embed_batch_async(
+    client: httpx.AsyncClient,
+    semaphore: asyncio.Semaphore,
+    headers: Dict[str, str],
+    batch: List[str],
+) -> List[List[float]]:
+    async with semaphore:
+        for attempt in range(GEMINI_MAX_RETRIES):
+            async with client.stream(
+                "POST", GEMINI_BATCH_EMBED_ENDPOINT, headers=headers, content=orjson.dumps(_batch_payload(batch))
+            ) as resp:
+                if resp.status_code == 200:
+                    parser = _BatchStreamParser(len(batch))
+                    async for chunk in resp.aiter_bytes():
+                        parser.feed(chunk)
+                    return parser.close()
+                await resp.aread()
+                if not _should_retry(resp.status_code, attempt):
+                    raise _batch_error(resp)
+            await asyncio.sleep(_retry_delay(attempt))
+    raise GeminiEmbeddingError("Gemini batch embed error: retries exhausted")
+
+
+async def _embed_batches_async(headers: Dict[str, str], batches: List[List[str]]) -> List[List[List[float]]]:
+    semaphore = asyncio.Semaphore(GEMINI_EMBED_CONCURRENCY)
+    async with httpx.AsyncClient(
+        http2=True,
+        timeout=httpx.Timeout(30.0, connect=5.0),
+        limits=httpx.Limits(max_keepalive_connections=GEMINI_EMBED_CONCURRENCY, max_connections=GEMINI_EMBED_CONCURRENCY),
+    ) as client:
+        # gather は入力順で結果を返すため、バッチの順序はそのまま保たれる
+        return await asyncio.gather(*[_embed_batch_async(client, semaphore, headers, b) for b in batches])
+
+
+def embed_contents_batch(texts: List[str]) -> List[List[float]]:
+    """Call Gemini Embeddings API (text-embedding-004:batchEmbedContents).
+
+    texts を GEMINI_BATCH_SIZE 件ずつに分け、最大 GEMINI_EMBED_CONCURRENCY 並列で送信する。
+    戻り値は入力順の埋め込み。
+    """
+    if not texts:
+        return []
+    headers = _get_headers()
+    batches = [texts[i:i + GEMINI_BATCH_SIZE] for i in range(0, len(texts), GEMINI_BATCH_SIZE)]
+
+    try:
+        if len(batches) == 1:
+            return _embed_batch(headers, batches[0])
+        batch_results = run_sync(_embed_batches_async(headers, batches))
     except httpx.HTTPError as e:
         raise GeminiEmbeddingError(f"HTTP error: {e}") from e
+    return [values for batch in batch_results for values in batch]
+
+
+class _PendingQueryBatch:
+    __slots__ = ("texts", "futures", "full")
+
+    def __init__(self) -> None:
+        self.texts: List[str] = []
+        self.futures: List[Future] = []
+        self.full = threading.Event()
+
+
+class _QueryEmbedBatcher:
+    """並行スレッドからのクエリ埋め込みを短い時間窓でまとめ、batchEmbedContents 1回で処理する。
+
+    最初に到着したスレッドがリーダーとなり、窓が閉じるか上限件数に達した時点でまとめて送信する。
+    """
+
+    def __init__(self, max_wait: float, max_size: int):
+        self._max_wait = max_wait
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._batch: Optional[_PendingQueryBatch] = None
+
+    def embed(self, text: str) -> List[float]:
+        future: Future = Future()
+        with self._lock:
+            batch = self._batch
+            leader = batch is None
+            if leader:
+                batch = self._batch = _PendingQueryBatch()
+            batch.texts.append(text)
+            batch.futures.append(future)
+            if len(batch.texts) >= self._max_size:
+                self._batch = None
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(self._max_wait)
+            with self._lock:
+                if self._batch is batch:
+                    self._batch = None
+            self._flush(batch)
+        return future.result()
+
+    @staticmethod
+    def _flush(batch: _PendingQueryBatch) -> None:
+        # 同じクエリが重なった場合は1件として送信する
+        unique_texts = list(dict.fromkeys(batch.texts))
+        try:
+            if len(unique_texts) == 1:
+                vectors = [embed_content(unique_texts[0])]
+            else:
+                vectors = embed_contents_batch(unique_texts)
+        except Exception as e:
+            for future in batch.futures:
+                future.set_exception(e)
+            return
+        by_text = dict(zip(unique_texts, vectors))
+        for text, future in zip(batch.texts, batch.futures):
+            future.set_result(by_text[text])
+
+
+_QUERY_BATCHER = _QueryEmbedBatcher(QUERY_BATCH_WAIT_SECONDS, QUERY_BATCH_MAX_SIZE)
+
+
+def _cache_key(text: str) -> str:
+    return hashlib.sha256(f"{GEMINI_EMBED_MODEL}\0{text}".encode("utf-8")).hexdigest()
+
+
+class _EmbeddingCache:
+    """SHA-256(text) をキーにした埋め込みのディスクキャッシュ（SQLite）。
+
+    再インデックス時に内容が変わっていないチャンクの API 呼び出しを省く。
+    キャッシュの読み書きに失敗しても埋め込み処理自体は継続する。
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+            self._conn = conn
+        return self._conn
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        if not keys:
+            return found
+        try:
+            with self._lock:
+                conn = self._connect()
+                # SQLite のバインド変数上限を超えないよう分割して問い合わせる
+                for i in range(0, len(keys), 500):
+                    chunk = keys[i:i + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    rows = conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                    ).fetchall()
+                    for key, blob in rows:
+                        found[key] = np.frombuffer(blob, dtype=np.float64).tolist()
+        except sqlite3.Error as e:
+            logger.warning("埋め込みキャッシュ読み込みエラー: %s", e)
+        return found
+
+    def set_many(self, items: Dict[str, List[float]]) -> None:
+        if not items:
+            return
+        try:
+            with self._lock:
+                conn = self._connect()
+                with conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                        [(k, np.asarray(v, dtype=np.float64).tobytes()) for k, v in items.items()],
+                    )
+        except sqlite3.Error as e:
+            logger.warning("埋め込みキャッシュ書き込みエラー: %s", e)
+
+
+_EMBED_CACHE = _EmbeddingCache(Path(CONFIG.CHROMA_STORE_DIR) / "embed_cache.sqlite3")
+
+
+@lru_cache(maxsize=1024)
+def _embed_query_cached(text: str) -> tuple:
+    key = _cache_key(text)
+    cached = _EMBED_CACHE.get_many([key])
+    if key in cached:
+        return tuple(cached[key])
+    values = _QUERY_BATCHER.embed(text)
+    _EMBED_CACHE.set_many({key: values})
+    return tuple(values)
+
+
+def embed_documents_cached(texts: List[str]) -> List[List[float]]:
+    """キャッシュに無いテキストだけをバッチ埋め込みし、入力順に再構成して返す。"""
+    if not texts:
+        return []
+    keys = [_cache_key(t) for t in texts]
+    cached = _EMBED_CACHE.get_many(list(dict.fromkeys(keys)))
+
+    missing: Dict[str, str] = {}
+    for key, text in zip(keys, texts):
+        if key not in cached and key not in missing:
+            missing[key] = text
+    if missing:
+        fetched = dict(zip(missing.keys(), embed_contents_batch(list(missing.values()))))
+        _EMBED_CACHE.set_many(fetched)
+        cached.update(fetched)
+    return [list(cached[key]) for key in keys]
 
 
 class GeminiEmbeddings:
-    """LangChain互換の埋め込みクラス（embed_documents / embed_query）。"""
+    """LangChain互換の埋め込みクラス（embed_documents / embed_query）。
+
+    Chroma 0.4 系は list[float] しか受け付けないため LangChain 向けメソッドはリストを返す。
+    NumPy で類似度計算などを行う呼び出し側は *_array 版（float32）を使う。
+    """
 
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        return [embed_content(t) for t in texts]
+        return embed_documents_cached(texts)
 
     def embed_query(self, text: str) -> List[float]:
-        return embed_content(text)
+        return list(_embed_query_cached(text))
+
+    def embed_documents_array(self, texts: List[str]) -> np.ndarray:
+        """埋め込みを (N, D) の float32 配列で返す。"""
+        vectors = embed_documents_cached(texts)
+        if not vectors:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.asarray(vectors, dtype=np.float32)
+
+    def embed_query_array(self, text: str) -> np.ndarray:
+        """クエリ埋め込みを (D,) の float32 配列で返す。"""
+        return np.asarray(_embed_query_cached(text), dtype=np.float32)
+
+
+@lru_cache(maxsize=None)
+def _local_embeddings() -> Any:
+    from local_embeddings import LocalEmbeddings
+    return LocalEmbeddings()
+
+
+def get_embeddings() -> Any:
+    """RAG_EMBEDDING_PROVIDER に応じた埋め込みクラスを返す（onnx の場合はモデルをプロセス内で共有）。"""
+    if CONFIG.RAG_EMBEDDING_PROVIDER == "onnx":
+        return _local_embeddings()
+    return GeminiEmbeddings()
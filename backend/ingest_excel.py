@@ -3,6 +3,7 @@ Excel ファイルから企業データを取り込み、RAG システム用に
 企業名（A列）とリードステータス（G列）を重視し、メタデータとして格納。
 """
 
+import numpy as np
 import pandas as pd
 from pathlib import Path
 from typing import Dict, Any, List, Optional, Tuple
@@ -15,34 +16,107 @@ from pydantic.v1 import SecretStr
 from datetime import datetime
 from urllib.parse import urlparse
 import httpx
+import asyncio
 import re
+import os
 import json
+import hashlib
+import logging
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 
-from config import Config
-from gemini import GeminiEmbeddings
+from config import CONFIG, LEADS_COLLECTION_METADATA
+from gemini import get_embeddings
 from utils.name_normalize import normalize_name, build_name_variants
+from utils.async_utils import run_sync
+from utils.chroma_json import install_orjson_metadata_codec
+
+# XLSX の読み込みエンジン（Rust 実装の python-calamine があれば優先し、無ければ openpyxl）
+try:
+    import python_calamine  # noqa: F401
+    EXCEL_ENGINE = "calamine"
+except ImportError:
+    EXCEL_ENGINE = "openpyxl"
+
+# 取り込み済みファイルの判定に使うハッシュ（blake3 があれば優先し、無ければ hashlib.blake2b）
+try:
+    import blake3
+except ImportError:
+    blake3 = None
+
+# add_texts 1回あたりのチャンク数（埋め込み API の1リクエストに相当）と最大スレッド数
+ADD_BATCH_SIZE = 100
+INGEST_MAX_WORKERS = 4
+# 既存データの一括削除で1回の問い合わせに含める行数
+DELETE_BATCH_SIZE = 500
+# URL からの企業名推定で同時に取得するページ数
+URL_FETCH_CONCURRENCY = 16
+# 前回取り込んだファイルのハッシュと結果を保存するファイル（CHROMA_STORE_DIR 内）と、ハッシュ計算時の読み込みサイズ
+INGEST_CACHE_FILENAME = "excel_ingest_cache.json"
+HASH_CHUNK_SIZE = 1 << 20
+# セル本文のチャンクサイズ（これ以下の長さなら分割せずそのまま1ドキュメントにする）
+CELL_CHUNK_SIZE = 600
+# ページタイトルからの企業名推定に使う正規表現（呼び出しごとのコンパイル・キャッシュ参照を避けるため事前にコンパイル）
+TITLE_PATTERN = re.compile(r"<title[^>]*>(.*?)</title>", re.IGNORECASE | re.DOTALL)
+CORP_NAME_PATTERNS = tuple(re.compile(p) for p in (r"([^\s]+株式会社)", r"([^\s]+有限会社)", r"([^\s]+合同会社)"))
+JAPANESE_NAME_PATTERN = re.compile(r"([ぁ-んァ-ン一-龯]{3,})")
+
+# 結合セルとして左隣の値を継承する列範囲（H-L列、0ベースで7-11列）
+MERGED_CELL_COLUMNS = slice(7, 12)
+
+logger = logging.getLogger(__name__)
+
+# Chroma へのメタデータ書き込みを orjson でシリアライズする
+install_orjson_metadata_codec()
+
+
+def fill_merged_cells(df: pd.DataFrame) -> int:
+    """H-L列の空セル（欠損値・空白のみ・"nan" を含む）を同じ行の左隣の値で埋め、埋めたセル数を返す（df をその場で更新）。
+
+    ExcelIngestor と RAGService の Excel 読み込みで共通の結合セル処理。左側に値が無い空セルは元の値のまま残す。
+    """
+    block = df.iloc[:, MERGED_CELL_COLUMNS]
+    empty = (block.isna() | block.apply(lambda col: col.astype(str).str.strip().isin(["", "nan"]))).to_numpy(dtype=bool)
+    # 各セルについて、左側で最も近い値のある列位置（無ければ -1）を累積最大で求める
+    source = np.where(empty, -1, np.arange(empty.shape[1]))
+    np.maximum.accumulate(source, axis=1, out=source)
+    inherited = empty & (source >= 0)
+    if not inherited.any():
+        return 0
+    values = block.to_numpy(dtype=object)
+    filled = np.take_along_axis(values, np.maximum(source, 0), axis=1)
+    df.iloc[:, MERGED_CELL_COLUMNS] = np.where(inherited, filled, values)
+    return int(inherited.sum())
 
 
 class ExcelIngestor:
     """Excel ファイルを RAG システム用にインデックス化するクラス"""
     
+    URL_PATTERN = re.compile(r"(https?://[^\s]+)", re.IGNORECASE)
+    
     def __init__(self):
-        self.config = Config()
+        self.config = CONFIG
         
         if not self.config.GEMINI_API_KEY:
             raise ValueError("GEMINI_API_KEY が設定されていません。.envファイルに設定してください。")
         
-        self.embeddings = GeminiEmbeddings()
+        self.embeddings = get_embeddings()
         
-        persist_dir = str(Path(self.config.CHROMA_STORE_DIR).resolve())
+        persist_dir = self.config.CHROMA_STORE_DIR
         self.vectorstore = Chroma(
             collection_name="leads",
             persist_directory=persist_dir,
-            embedding_function=self.embeddings
+            embedding_function=self.embeddings,
+            collection_metadata=LEADS_COLLECTION_METADATA,
         )
         
+        # URL から推定した企業名のドメイン単位キャッシュ
+        self._company_by_domain: Dict[str, str] = {}
+        
         self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=600,
+            chunk_size=CELL_CHUNK_SIZE,
             chunk_overlap=80,
             length_function=len,
             separators=["\n\n", "\n", "。", "、", " ", ""]
@@ -54,49 +128,163 @@ class ExcelIngestor:
         sheet_name: Optional[str] = None
     ) -> Dict[str, Any]:
         try:
+            # 前回と同じ内容のファイルで、コレクションもその後変更されていなければ取り込みを省略する
+            cache_key = self._ingest_cache_key(file_path, sheet_name)
+            cached = self._cached_ingest_result(cache_key)
+            if cached is not None:
+                logger.info("前回と同じファイルのため取り込みをスキップ: %s", file_path)
+                return cached
+            
             df, actual_sheet_name = self._load_excel_data(file_path, sheet_name)
             if df is None:
                 return {"status": "error", "message": "Excel ファイルの読み込みに失敗しました"}
             processed_data = self._preprocess_data(df, actual_sheet_name)
             if not processed_data:
                 return {"status": "warning", "message": "処理可能なデータが見つかりませんでした"}
-            total_chunks = 0
-            for data in processed_data:
-                chunks = self._create_documents(data)
-                total_chunks += len(chunks)
-                self._delete_existing_document(data["excel_row"])
-                if chunks:
-                    texts = [chunk.page_content for chunk in chunks]
-                    metadatas = [chunk.metadata for chunk in chunks]
-                    ids = [f"{data['excel_row']}_cell_{data['column_index']}_chunk_{i}" for i in range(len(chunks))]
-                    self.vectorstore.add_texts(texts=texts, metadatas=metadatas, ids=ids)
-                    print(f"DEBUG: ベクターストア追加 - 行{data['excel_row']}: {chunks[0].page_content[:50]}...")
-            return {"status": "success", "message": f"処理完了: {len(processed_data)} レコード、{total_chunks} チャンク", "processed_records": len(processed_data), "total_chunks": total_chunks, "collection": "leads"}
+            # 既存データは追加前にまとめて削除する（同じ行の他セルを追加後に消さないため）
+            self._bulk_delete_existing(sorted({data["excel_row"] for data in processed_data}))
+            # ファイル全体のチャンクを集めてから、埋め込み API 待ちが支配的なのでバッチ単位でスレッド並列に追加する
+            texts, metadatas, ids = self._collect_chunks(processed_data)
+            batches = [
+                (texts[i:i + ADD_BATCH_SIZE], metadatas[i:i + ADD_BATCH_SIZE], ids[i:i + ADD_BATCH_SIZE])
+                for i in range(0, len(texts), ADD_BATCH_SIZE)
+            ]
+            if batches:
+                self._write_batches(batches)
+            total_chunks = len(texts)
+            result = {"status": "success", "message": f"処理完了: {len(processed_data)} レコード、{total_chunks} チャンク", "processed_records": len(processed_data), "total_chunks": total_chunks, "collection": "leads"}
+            self._save_ingest_cache(cache_key, result)
+            return result
         except Exception as e:
             return {"status": "error", "message": f"処理エラー: {str(e)}"}
     
+    def _file_hash(self, path: Path) -> str:
+        hasher = blake3.blake3() if blake3 is not None else hashlib.blake2b()
+        with open(path, "rb") as f:
+            while chunk := f.read(HASH_CHUNK_SIZE):
+                hasher.update(chunk)
+        return hasher.hexdigest()
+    
+    def _ingest_cache_key(self, file_path: str, sheet_name: Optional[str]) -> Optional[str]:
+        path = Path(file_path)
+        if not path.is_file():
+            return None
+        return f"{self._file_hash(path)}:{sheet_name or ''}"
+    
+    def _cached_ingest_result(self, cache_key: Optional[str]) -> Optional[Dict[str, Any]]:
+        """前回の取り込みと同じキーで、コレクションの件数も前回取り込み直後から変わっていなければ結果を返す"""
+        if cache_key is None:
+            return None
+        try:
+            with open(Path(self.config.CHROMA_STORE_DIR) / INGEST_CACHE_FILENAME, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+            if cache.get("key") != cache_key or cache.get("collection_count") != self.vectorstore._collection.count():
+                return None
+            return cache["result"]
+        except (OSError, ValueError, KeyError):
+            return None
+    
+    def _save_ingest_cache(self, cache_key: Optional[str], result: Dict[str, Any]):
+        # 同じ行番号を持つ別ファイルの取り込みで上書きされうるため、直近1件のみ保持する
+        if cache_key is None:
+            return
+        try:
+            cache_path = Path(self.config.CHROMA_STORE_DIR) / INGEST_CACHE_FILENAME
+            tmp_path = cache_path.with_name(cache_path.name + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"key": cache_key, "collection_count": self.vectorstore._collection.count(), "result": result}, f, ensure_ascii=False)
+            os.replace(tmp_path, cache_path)
+        except Exception as e:
+            logger.warning("取り込みキャッシュの保存に失敗: %s", e)
+    
+    def _collect_chunks(self, processed_data: List[Dict[str, Any]]) -> Tuple[List[str], List[Dict[str, Any]], List[str]]:
+        """全レコードをドキュメント化し、add_texts 用のテキスト・メタデータ・ID をまとめて返す"""
+        texts: List[str] = []
+        metadatas: List[Dict[str, Any]] = []
+        ids: List[str] = []
+        for data in processed_data:
+            chunks = self._create_documents(data)
+            # ID は行・列ごとの接頭辞にチャンク番号を付けるだけなので、接頭辞はセルごとに一度だけ作る
+            id_prefix = f"{data['excel_row']}_cell_{data['column_index']}_chunk_"
+            texts.extend([chunk.page_content for chunk in chunks])
+            metadatas.extend([chunk.metadata for chunk in chunks])
+            ids.extend([id_prefix + str(i) for i in range(len(chunks))])
+        return texts, metadatas, ids
+    
+    def _write_batches(self, batches: List[Tuple[List[str], List[Dict[str, Any]], List[str]]]):
+        """
+        埋め込み生成と Chroma への書き込みをパイプライン化する
+        
+        埋め込みはスレッドプールで並列に計算し、書き込みは単一の writer スレッドがキュー経由で順に行うため、
+        API 待ちと HNSW 挿入・SQLite 永続化が重なる。
+        埋め込みの投入はワーカー数分までに抑え、書き込みが詰まれば埋め込みも待つ（メモリ上の埋め込みを一定量に保つ）。
+        埋め込み・書き込みのいずれかが失敗した時点で未着手のバッチは取り消し、それ以上 API を呼ばない。
+        """
+        write_queue: "queue.Queue[Optional[Tuple[List[str], List[Dict[str, Any]], List[str], List[List[float]]]]]" = queue.Queue(maxsize=INGEST_MAX_WORKERS * 2)
+        writer_errors: List[Exception] = []
+        writer = threading.Thread(target=self._chroma_writer, args=(write_queue, writer_errors), daemon=True)
+        writer.start()
+        max_workers = min(INGEST_MAX_WORKERS, len(batches))
+        pending: "deque[Future]" = deque()
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                try:
+                    for batch in batches:
+                        if writer_errors:
+                            break
+                        pending.append(executor.submit(self._embed_batch, *batch))
+                        # 先頭のバッチから順に書き込みへ回し、投入中のバッチをワーカー数までに保つ
+                        if len(pending) >= max_workers:
+                            write_queue.put(pending.popleft().result())
+                    while pending and not writer_errors:
+                        write_queue.put(pending.popleft().result())
+                finally:
+                    for future in pending:
+                        future.cancel()
+        finally:
+            write_queue.put(None)
+            writer.join()
+        if writer_errors:
+            raise writer_errors[0]
+    
+    def _embed_batch(self, texts: List[str], metadatas: List[Dict[str, Any]], ids: List[str]) -> Tuple[List[str], List[Dict[str, Any]], List[str], List[List[float]]]:
+        return texts, metadatas, ids, self.embeddings.embed_documents(texts)
+    
+    def _chroma_writer(self, write_queue: "queue.Queue", errors: List[Exception]):
+        # エラー後もキューは最後まで読み切り、埋め込み側が put で詰まらないようにする
+        collection = self.vectorstore._collection
+        while (item := write_queue.get()) is not None:
+            if errors:
+                continue
+            texts, metadatas, ids, embeddings = item
+            try:
+                collection.upsert(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=texts)
+                logger.debug("ベクターストア追加 - %s〜%s: %sチャンク", ids[0], ids[-1], len(texts))
+            except Exception as e:
+                errors.append(e)
+    
     def _load_excel_data(self, file_path: str, sheet_name: Optional[str]) -> Tuple[Optional[pd.DataFrame], str]:
         try:
             path = Path(file_path)
             if not path.exists():
-                print(f"ERROR: ファイルが見つかりません: {file_path}")
+                logger.error("ファイルが見つかりません: %s", file_path)
                 return None, ""
             
-            # シート名の自動選択（Noneの場合は最初のシートを使用）
-            if sheet_name is None:
-                # 最初のシート名を取得
-                xl_file = pd.ExcelFile(str(path), engine='openpyxl')
-                sheet_name = xl_file.sheet_names[0]
-                print(f"INFO: 自動選択されたシート: {sheet_name}")
-            
-            # 確実に文字列にする
-            actual_sheet_name: str = sheet_name or ""
-            
-            # 結合セルに対応したExcel読み込み
-            print(f"INFO: 結合セル対応でExcelファイル読み込み開始: {actual_sheet_name}")
-            
-            # まず生データで読み込み（ヘッダーなし）
-            df_raw = pd.read_excel(str(path), sheet_name=actual_sheet_name, engine='openpyxl', dtype=str, header=None)
+            # ワークブックは一度だけ開き、シート名の取得とデータ読み込みで使い回す
+            with pd.ExcelFile(str(path), engine=EXCEL_ENGINE) as xl_file:
+                # シート名の自動選択（Noneの場合は最初のシートを使用）
+                if sheet_name is None:
+                    sheet_name = xl_file.sheet_names[0]
+                    logger.info("自動選択されたシート: %s", sheet_name)
+                
+                # 確実に文字列にする
+                actual_sheet_name: str = sheet_name or ""
+                
+                # 結合セルに対応したExcel読み込み
+                logger.info("結合セル対応でExcelファイル読み込み開始: %s", actual_sheet_name)
+                
+                # まず生データで読み込み（ヘッダーなし）
+                df_raw = xl_file.parse(sheet_name=actual_sheet_name, dtype=str, header=None)
             
             # DataFrameかどうかチェック（複数シート読み込み時は辞書になる場合がある）
             if not isinstance(df_raw, pd.DataFrame):
@@ -104,36 +292,36 @@ class ExcelIngestor:
                     # 辞書の場合は最初の値を取得
                     df_raw = list(df_raw.values())[0]
                     if not isinstance(df_raw, pd.DataFrame):
-                        print(f"ERROR: 辞書から取得したデータがDataFrameではありません: {type(df_raw)}")
+                        logger.error("辞書から取得したデータがDataFrameではありません: %s", type(df_raw))
                         return None, actual_sheet_name
                 else:
-                    print(f"ERROR: 予期しない型のデータが返されました: {type(df_raw)}")
+                    logger.error("予期しない型のデータが返されました: %s", type(df_raw))
                     return None, actual_sheet_name
             
             # 型確認後のfillna実行
             df_raw = df_raw.fillna("")
             
-            print(f"INFO: 生データ読み込み完了 - 形状: {df_raw.shape}")
-            print(f"INFO: 最初の3行:")
-            for i in range(min(3, len(df_raw))):
-                print(f"  行{i+1}: {list(df_raw.iloc[i])}")
+            logger.info("生データ読み込み完了 - 形状: %s", df_raw.shape)
+            if logger.isEnabledFor(logging.DEBUG):
+                for i in range(min(3, len(df_raw))):
+                    logger.debug("  行%s: %s", i + 1, list(df_raw.iloc[i]))
             
             # 1行目をヘッダーとして使用
             if len(df_raw) < 2:
-                print(f"ERROR: データが不十分です（行数: {len(df_raw)}）")
+                logger.error("データが不十分です（行数: %s）", len(df_raw))
                 return None, actual_sheet_name
                 
             # ヘッダー行を取得（1行目）
             header_row = df_raw.iloc[0].tolist()
-            print(f"INFO: 元のヘッダー行: {header_row}")
+            logger.info("元のヘッダー行: %s", header_row)
             
             # H列からL列の結合セル問題に対応
             processed_header = self._process_merged_header(header_row)
-            print(f"INFO: 処理後ヘッダー: {processed_header}")
+            logger.info("処理後ヘッダー: %s", processed_header)
             
             # データ部分を取得（2行目以降）
             if len(df_raw) < 2:
-                print(f"WARNING: データ行がありません")
+                logger.warning("データ行がありません")
                 return None, actual_sheet_name
                 
             data_part = df_raw.iloc[1:].copy()
@@ -143,44 +331,36 @@ class ExcelIngestor:
             data_part = self._process_merged_cells_data(data_part)
             
             # 列名を標準化
-            print(f"INFO: 列名標準化前の列名: {list(data_part.columns)}")
+            logger.info("列名標準化前の列名: %s", list(data_part.columns))
             data_part = data_part.rename(columns={
                 "企業名": "company_name",
                 "会社名": "company_name",
                 "ステータス": "lead_status",
                 "リードステータス": "lead_status"
             })
-            print(f"INFO: 列名標準化後の列名: {list(data_part.columns)}")
+            logger.info("列名標準化後の列名: %s", list(data_part.columns))
             
             # デバッグ用出力
-            print(f"DEBUG: 列名一覧:")
-            print(data_part.columns.tolist())
-            print(f"DEBUG: データの先頭5行:")
-            print(data_part.head())
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("データの先頭5行:\n%s", data_part.head())
             
-            print(f"INFO: Excel データ読み込み完了 - シート: {actual_sheet_name}, 形状: {data_part.shape}")
-            print(f"INFO: 最終列名: {list(data_part.columns)}")
-            print(f"INFO: データ行数（ヘッダー除く）: {len(data_part)}")
+            logger.info("Excel データ読み込み完了 - シート: %s, 形状: %s", actual_sheet_name, data_part.shape)
+            logger.info("最終列名: %s", list(data_part.columns))
+            logger.info("データ行数（ヘッダー除く）: %s", len(data_part))
             
             # サンプルデータの表示
-            if len(data_part) > 0:
-                print(f"INFO: サンプルデータ（1行目）:")
-                for col in data_part.columns:
-                    value = data_part.iloc[0][col] if len(data_part) > 0 else ""
-                    print(f"  {col}: '{value}'")
+            if len(data_part) > 0 and logger.isEnabledFor(logging.DEBUG):
+                logger.debug("サンプルデータ（1行目）: %s", data_part.iloc[0].to_dict())
             
             return data_part, actual_sheet_name
         except Exception as e:
-            print(f"ERROR: Excel ファイル読み込みエラー: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Excel ファイル読み込みエラー: %s", e)
             return None, ""
     
     def _preprocess_data(self, df: pd.DataFrame, sheet_name: str) -> List[Dict[str, Any]]:
         # row_id列を付与（Excelの表示行番号に一致）
         df = df.reset_index().assign(row_id=lambda d: d.index + 2)
         
-        processed_data = []
         columns = list(df.columns)
         
         # 列名ベースでマッピング（標準化された列名を使用）
@@ -193,7 +373,7 @@ class ExcelIngestor:
         else:
             # フォールバック: 最初の列を使用
             company_col = columns[0] if len(columns) > 0 else None
-            print(f"WARNING: company_name列が見つからないため、最初の列({company_col})を使用")
+            logger.warning("company_name列が見つからないため、最初の列(%s)を使用", company_col)
         
         # lead_status列を探す
         if "lead_status" in columns:
@@ -201,121 +381,152 @@ class ExcelIngestor:
         else:
             # フォールバック: 6番目の列を使用（従来の動作）
             lead_status_col = columns[6] if len(columns) > 6 else None
-            print(f"WARNING: lead_status列が見つからないため、6番目の列({lead_status_col})を使用")
+            logger.warning("lead_status列が見つからないため、6番目の列(%s)を使用", lead_status_col)
+        
+        logger.info("処理対象列 - 企業名: %s, リードステータス: %s", company_col, lead_status_col)
+        logger.info("セル単位処理モードで実行中... (row_id列を付与)")
         
-        print(f"INFO: 処理対象列 - 企業名: {company_col}, リードステータス: {lead_status_col}")
-        print(f"INFO: セル単位処理モードで実行中... (row_id列を付与)")
+        # 企業名・リードステータスの整形と有効判定は列単位でまとめて行う
+        if company_col:
+            company_series = df[company_col].astype(str).str.strip()
+        else:
+            company_series = pd.Series("", index=df.index)
+        valid_mask = (
+            company_series.ne("")
+            & ~company_series.str.lower().isin(["nan", "none"])
+            & company_series.ne(company_col)
+        )
+        normalized_companies = company_series.where(~valid_mask, company_series[valid_mask].map(self._normalize_company_name))
+        
+        if lead_status_col:
+            status_series = df[lead_status_col].astype(str).str.strip()
+            status_series = status_series.mask(status_series.str.lower().isin(["nan", "none"]), "未設定")
+        else:
+            status_series = pd.Series("", index=df.index)
         
-        for idx, row in df.iterrows():
+        # URL検出（企業名が空のときの補完に利用）: 各行で左から最初に見つかったURLを列単位の抽出でまとめて求める
+        url_series = self._find_first_url_per_row(df)
+        domain_series = url_series.map(lambda u: self._extract_domain(u) if u else "")
+        
+        # 企業名が無効な行のURLは、ページタイトルからの企業名推定をまとめて非同期で行う
+        inferred_by_url = self._batch_infer_companies_from_urls(
+            list(dict.fromkeys(url_series[~valid_mask & url_series.ne("")].tolist()))
+        )
+        
+        # 行単位では企業名の確定だけを行い、セルデータは残った行についてまとめて作成する
+        kept_positions: List[int] = []
+        row_meta: Dict[str, List[Any]] = {
+            "company": [], "lead_status": [], "url": [], "url_domain": [], "company_alias": [],
+            "company_name_norm": [], "company_name_variants_str": [],
+        }
+        # セル値は _create_cell_data で ndarray としてまとめて扱うので、ここでは行タプルを作らず列ごとのリストだけを走査する
+        for position, (excel_row_num, is_valid, company, lead_status, detected_url, url_domain) in enumerate(zip(
+            df["row_id"].astype(int).tolist(),
+            valid_mask.tolist(),
+            normalized_companies.tolist(),
+            status_series.tolist(),
+            url_series.tolist(),
+            domain_series.tolist(),
+        )):
             try:
-                company = str(row[company_col]).strip() if company_col else ""
-                # row_id を使用（Excel行番号と一致）
-                excel_row_num = int(row['row_id'])
-                    
-                print(f"DEBUG: 行{excel_row_num}処理中 - 企業名列'{company_col}'の値: '{company}'")
+                logger.debug("行%s処理中 - 企業名列'%s'の値: '%s'", excel_row_num, company_col, company)
                 
-                # URL検出（企業名が空のときの補完に利用）
-                detected_url = self._find_first_url_in_row(row)
-                url_domain = self._extract_domain(detected_url) if detected_url else ""
                 inferred_company = ""
                 company_alias = ""
-                if not company or company.lower() in ['nan', 'none', ''] or company == company_col:
+                if not is_valid:
                     # URLから企業名を推定（失敗時はドメインのサブドメインをエイリアスに）
                     if detected_url:
-                        inferred_company = self._infer_company_from_url(detected_url)
+                        inferred_company = inferred_by_url.get(detected_url, "")
                         if not inferred_company and url_domain:
                             company_alias = self._alias_from_domain(url_domain)
                             inferred_company = company_alias
                     if inferred_company:
-                        company = inferred_company
-                        print(f"INFO: 行 {excel_row_num}: URLから企業名を推定 -> '{company}' (domain={url_domain})")
+                        company = self._normalize_company_name(inferred_company)
+                        logger.info("行 %s: URLから企業名を推定 -> '%s' (domain=%s)", excel_row_num, company, url_domain)
                     else:
-                        print(f"INFO: スキップ - 行 {excel_row_num}: 企業名が無効でURLからも推定不可")
-                        print(f"  行データサンプル: {dict(list(row.items())[:3])}")
+                        logger.info("スキップ - 行 %s: 企業名が無効でURLからも推定不可", excel_row_num)
                         continue
-                    
-                lead_status = str(row[lead_status_col]).strip() if lead_status_col else ""
-                if lead_status.lower() in ['nan', 'none']:
-                    lead_status = "未設定"
-                    
-                company = self._normalize_company_name(company)
-                
-                print(f"DEBUG: 行{excel_row_num} - 企業名: '{company}', ステータス: '{lead_status}'")
                 
-                # セル単位でのデータ処理
-                cell_data_list = self._create_cell_data(
-                    row=row,
-                    columns=columns,
-                    sheet_name=sheet_name,
-                    excel_row_num=excel_row_num,
-                    company=company,
-                    lead_status=lead_status,
-                    url=detected_url or "",
-                    url_domain=url_domain,
-                    company_alias=company_alias or self._alias_from_domain(url_domain) if url_domain else ""
-                )
+                logger.debug("行%s - 企業名: '%s', ステータス: '%s'", excel_row_num, company, lead_status)
                 
-                if cell_data_list:
-                    processed_data.extend(cell_data_list)
-                    print(f"INFO: 処理済み - 行 {excel_row_num}: {company} ({lead_status}) - {len(cell_data_list)}セル")
-                    
-                    # セル詳細をデバッグ出力
-                    for cell_data in cell_data_list[:3]:  # 最初の3セルのみ表示
-                        print(f"  セル: {cell_data['column_name']} = '{cell_data['cell_value']}'")
-                else:
-                    print(f"WARNING: 行 {excel_row_num}: セルデータが作成されませんでした")
-                    print(f"  企業名: '{company}', 行データ: {dict(list(row.items())[:5])}")
+                kept_positions.append(position)
+                row_meta["company"].append(company)
+                row_meta["lead_status"].append(lead_status)
+                row_meta["url"].append(detected_url or "")
+                row_meta["url_domain"].append(url_domain)
+                row_meta["company_alias"].append(company_alias or self._alias_from_domain(url_domain) if url_domain else "")
+                # 企業名の正規化とバリアントは行ごとに一度だけ求め、各セルのドキュメントで使い回す
+                row_meta["company_name_norm"].append(normalize_name(company))
+                row_meta["company_name_variants_str"].append("|".join(build_name_variants(company)))
             except Exception as e:
-                excel_row_num = int(row.get('row_id', 2) or 2)
-                print(f"WARNING: 行 {excel_row_num} の処理をスキップ: {e}")
+                logger.warning("行 %s の処理をスキップ: %s", excel_row_num, e)
                 continue
-        print(f"INFO: 前処理完了 - {len(processed_data)} レコード処理")
+        
+        # セル単位でのデータ処理
+        processed_data = self._create_cell_data(df.iloc[kept_positions], row_meta, sheet_name)
+        logger.info("前処理完了 - %s レコード処理", len(processed_data))
         return processed_data
     
     def _normalize_company_name(self, company: str) -> str:
         """既存のコード互換性のため残すが、新しい正規化関数を呼び出す"""
         return normalize_name(company)
     
-    def _create_cell_data(self, row: pd.Series, columns: List[str], sheet_name: str, excel_row_num: int, company: str, lead_status: str, url: str = "", url_domain: str = "", company_alias: str = "") -> List[Dict[str, Any]]:
-        """各セルを個別のデータとして作成。URLやエイリアス情報も付与"""
-        cell_data_list = []
+    def _create_cell_data(self, df: pd.DataFrame, row_meta: Dict[str, List[Any]], sheet_name: str) -> List[Dict[str, Any]]:
+        """各セルを個別のデータとして作成。URLやエイリアス情報も付与
+
+        行ごとの dict 生成を避け、全セルを列方向の配列（行優先の順）に展開してからまとめてレコード化する
+        """
+        n_rows, n_cols = df.shape
+        if n_rows == 0:
+            return []
+        columns = np.array([str(c) for c in df.columns], dtype=object)
         
-        for col_idx, (col_name, value) in enumerate(zip(columns, row)):
-            try:
-                # 値の正規化
-                str_value = str(value).strip()
-                if not str_value or str_value.lower() in ['nan', 'none', ''] or str(col_name).startswith('Unnamed:'):
-                    continue
-                
-                # セル固有のID作成
-                cell_id = f"{sheet_name}_row_{excel_row_num}_col_{col_idx}_{col_name.replace(' ', '_')}"
-                
-                # セルデータ作成（詳細情報を含める）
-                cell_content = f"【行{excel_row_num}】企業名: {company} | リードステータス: {lead_status} | {col_name}: {str_value}"
-                
-                cell_data = {
-                    "row_id": cell_id,
-                    "company": company,
-                    "lead_status": lead_status,
-                    "sheet": sheet_name,
-                    "excel_row": excel_row_num,
-                    "column_index": col_idx,
-                    "column_name": col_name,
-                    "cell_value": str_value,
-                    "structured_data": cell_content,
-                    "updated_at": datetime.now().isoformat(),
-                    "url": url,
-                    "url_domain": url_domain,
-                    "company_alias": company_alias
-                }
-                
-                cell_data_list.append(cell_data)
-                print(f"DEBUG: セル作成 - {cell_id}: {cell_content}")
-                
-            except Exception as e:
-                print(f"WARNING: セル処理エラー - 行 {excel_row_num}, 列 {col_idx}: {e}")
-                continue
+        # 行優先で展開（行i・列jのセルが i * n_cols + j 番目）
+        values = pd.Series(df.to_numpy(dtype=object).ravel()).astype(str).str.strip()
+        column_index = np.tile(np.arange(n_cols), n_rows)
+        column_name = pd.Series(columns[column_index])
+        excel_row = np.repeat(df["row_id"].astype(int).to_numpy(), n_cols)
+        
+        keep = (
+            values.ne("")
+            & ~values.str.lower().isin(["nan", "none"])
+            & ~column_name.str.startswith("Unnamed:")
+        ).to_numpy()
+        if not keep.any():
+            logger.warning("セルデータが作成されませんでした")
+            return []
+        
+        long_df = pd.DataFrame({
+            "excel_row": excel_row[keep],
+            "column_index": column_index[keep],
+            "column_name": column_name[keep].to_numpy(),
+            "cell_value": values[keep].to_numpy(),
+        })
+        for key, meta_values in row_meta.items():
+            long_df[key] = np.repeat(np.array(meta_values, dtype=object), n_cols)[keep]
+        
+        excel_row_str = long_df["excel_row"].astype(str)
+        # セル固有のID作成
+        long_df["row_id"] = (
+            f"{sheet_name}_row_" + excel_row_str
+            + "_col_" + long_df["column_index"].astype(str)
+            + "_" + long_df["column_name"].str.replace(" ", "_", regex=False)
+        )
+        # セルデータ作成（詳細情報を含める）
+        long_df["structured_data"] = (
+            "【行" + excel_row_str + "】企業名: " + long_df["company"]
+            + " | リードステータス: " + long_df["lead_status"]
+            + " | " + long_df["column_name"] + ": " + long_df["cell_value"]
+        )
+        long_df["sheet"] = sheet_name
+        long_df["updated_at"] = datetime.now().isoformat()
         
+        cell_data_list = long_df[[
+            "row_id", "company", "lead_status", "sheet", "excel_row", "column_index", "column_name",
+            "cell_value", "structured_data", "updated_at", "url", "url_domain", "company_alias",
+            "company_name_norm", "company_name_variants_str",
+        ]].to_dict(orient="records")
+        logger.info("セルデータ作成 - %s 行から %s セル", n_rows, len(cell_data_list))
         return cell_data_list
     
     def _process_merged_header(self, header_row: List[str]) -> List[str]:
@@ -331,48 +542,32 @@ class ExcelIngestor:
                 col_letter = chr(ord('A') + i)  # A, B, C...
                 processed_header.append(f"列{col_letter}")
         
-        print(f"DEBUG: ヘッダー処理 - 元: {len(header_row)}列, 処理後: {len(processed_header)}列")
+        logger.debug("ヘッダー処理 - 元: %s列, 処理後: %s列", len(header_row), len(processed_header))
         return processed_header
     
     def _process_merged_cells_data(self, df: pd.DataFrame) -> pd.DataFrame:
-        """結合セルのデータを処理"""
-        # 各行で結合セルの値を前方・後方に伝播
-        for idx in df.index:
-            row = df.loc[idx].copy()
-            
-            # 空の値を前の値で埋める（前方埋め）
-            for i in range(1, len(row)):
-                if not str(row.iloc[i]).strip() or str(row.iloc[i]) == 'nan':
-                    if str(row.iloc[i-1]).strip() and str(row.iloc[i-1]) != 'nan':
-                        # 前のセルに値があれば継承（ただし、明らかに異なる列タイプの場合は除く）
-                        prev_col = df.columns[i-1]
-                        curr_col = df.columns[i]
-                        
-                        # H列からL列の結合セル対応
-                        h_col_idx = ord('H') - ord('A')  # 7
-                        l_col_idx = ord('L') - ord('A')  # 11
-                        
-                        if h_col_idx <= i-1 <= l_col_idx and h_col_idx <= i <= l_col_idx:
-                            row.iloc[i] = row.iloc[i-1]
-                            print(f"DEBUG: 結合セル処理 - 行{idx+2}, 列{curr_col}: '{row.iloc[i-1]}' を継承")
-            
-            df.loc[idx] = row
-        
+        """結合セルのデータを処理（H列からL列の空セルを左隣の値で前方埋め）"""
+        inherited = fill_merged_cells(df)
+        logger.debug("結合セル処理 - %sセルを継承", inherited)
         return df
     
     def _create_documents(self, data: Dict[str, Any]) -> List[Document]:
         content = data["structured_data"]
         
-        # 企業名の正規化とバリアント生成
+        # 企業名の正規化とバリアント（前処理で行ごとに求めたものがあればそれを使う）
         raw_company_name = data["company"]
-        normalized_company_name = normalize_name(raw_company_name)
-        company_name_variants = build_name_variants(raw_company_name)
+        normalized_company_name = data.get("company_name_norm")
+        if normalized_company_name is None:
+            normalized_company_name = normalize_name(raw_company_name)
+        company_name_variants_str = data.get("company_name_variants_str")
+        if company_name_variants_str is None:
+            company_name_variants_str = "|".join(build_name_variants(raw_company_name))
         
         base_metadata = {
             "company": data["company"], 
             "company_name_raw": raw_company_name,  # 生の企業名を保存
             "company_name_norm": normalized_company_name,  # 正規化された企業名
-            "company_name_variants": "|".join(company_name_variants),  # 検索用バリアント（文字列として保存）
+            "company_name_variants": company_name_variants_str,  # 検索用バリアント（文字列として保存）
             "lead_status": data["lead_status"], 
             "row_id": data["excel_row"],  # Excel行番号をrow_idとして使用
             "cell_id": data["row_id"],     # セル固有IDは別フィールドに保存
@@ -389,20 +584,16 @@ class ExcelIngestor:
             "cell_position": f"行{data['excel_row']}列{data.get('column_name', '')}"
         }
         
-        print(f"DEBUG: 企業名正規化 - 生: '{raw_company_name}' → 正規化: '{normalized_company_name}' → バリアント: {len(company_name_variants)}個")
-        
         # セル単位では通常チャンク分割は不要だが、値が長い場合に対応
-        if len(content) <= 600:
+        if len(content) <= CELL_CHUNK_SIZE:
             return [Document(page_content=content, metadata=base_metadata)]
         
         chunks = self.text_splitter.split_text(content)
-        documents = []
-        for i, chunk in enumerate(chunks):
-            chunk_metadata = base_metadata.copy()
-            chunk_metadata["chunk_index"] = i
-            chunk_metadata["total_chunks"] = len(chunks)
-            documents.append(Document(page_content=chunk, metadata=chunk_metadata))
-        return documents
+        total_chunks = len(chunks)
+        return [
+            Document(page_content=chunk, metadata={**base_metadata, "chunk_index": i, "total_chunks": total_chunks})
+            for i, chunk in enumerate(chunks)
+        ]
     
     def _delete_existing_document(self, excel_row_num: int):
         try:
@@ -411,9 +602,26 @@ class ExcelIngestor:
             results = collection.get(where={"row_id": excel_row_num})
             if results and results.get("ids"):
                 collection.delete(ids=results["ids"])
-                print(f"INFO: 既存データ削除 - row_id: {excel_row_num}")
+                logger.info("既存データ削除 - row_id: %s", excel_row_num)
+        except Exception as e:
+            logger.warning("既存データ削除エラー: %s", e)
+    
+    def _bulk_delete_existing(self, row_ids: List[int]):
+        """複数行の既存データを $in 条件でまとめて取得・削除する"""
+        try:
+            collection = self.vectorstore._collection
+            deleted = 0
+            # 1クエリのパラメータ数が大きくなりすぎないよう分割する
+            for i in range(0, len(row_ids), DELETE_BATCH_SIZE):
+                batch = row_ids[i:i + DELETE_BATCH_SIZE]
+                results = collection.get(where={"row_id": {"$in": batch}}, include=[])
+                if results and results.get("ids"):
+                    collection.delete(ids=results["ids"])
+                    deleted += len(results["ids"])
+            if deleted:
+                logger.info("既存データ削除 - %s行, %s件", len(row_ids), deleted)
         except Exception as e:
-            print(f"WARNING: 既存データ削除エラー: {e}")
+            logger.warning("既存データ削除エラー: %s", e)
     
     def get_collection_stats(self) -> Dict[str, Any]:
         try:
@@ -424,18 +632,15 @@ class ExcelIngestor:
         except Exception as e:
             return {"status": "error", "message": str(e)}
 
-    def _find_first_url_in_row(self, row: pd.Series) -> Optional[str]:
-        """行内のセルから最初に見つかったURLを返す"""
-        url_regex = re.compile(r"https?://[^\s]+", re.IGNORECASE)
-        for value in row.values:
-            try:
-                text = str(value)
-            except Exception:
-                continue
-            m = url_regex.search(text)
-            if m:
-                return m.group(0)
-        return None
+    def _find_first_url_per_row(self, df: pd.DataFrame) -> pd.Series:
+        """各行のセルから最初に見つかったURLを返す（見つからない行は空文字）"""
+        if df.empty or len(df.columns) == 0:
+            return pd.Series("", index=df.index, dtype=object)
+        matches = pd.concat(
+            [df.iloc[:, i].astype(str).str.extract(self.URL_PATTERN, expand=False) for i in range(len(df.columns))],
+            axis=1,
+        )
+        return matches.bfill(axis=1).iloc[:, 0].fillna("").astype(object)
 
     def _extract_domain(self, url: Optional[str]) -> str:
         if not url:
@@ -456,19 +661,43 @@ class ExcelIngestor:
         label = domain.split('.')[0]
         return label.replace('-', '').replace('_', '').strip()
 
-    def _infer_company_from_url(self, url: str) -> str:
-        """URLの<title>から企業名らしき文字列を推定（失敗時は空文字）"""
-        try:
-            with httpx.Client(timeout=5.0, follow_redirects=True) as client:
-                r = client.get(url, headers={"User-Agent": "Mozilla/5.0"})
-                if r.status_code >= 400:
-                    return ""
-                html = r.text or ""
-        except Exception:
-            return ""
+    def _batch_infer_companies_from_urls(self, urls: List[str]) -> Dict[str, str]:
+        """複数URLの企業名推定を非同期でまとめて行う（同一ドメインは一度だけ取得）"""
+        url_by_domain: Dict[str, str] = {}
+        for url in urls:
+            domain = self._extract_domain(url)
+            if domain not in self._company_by_domain:
+                url_by_domain.setdefault(domain, url)
+
+        if url_by_domain:
+            fetched = run_sync(self._fetch_companies_async(list(url_by_domain.values())))
+            for domain, company in zip(url_by_domain.keys(), fetched):
+                self._company_by_domain[domain] = company
+
+        return {url: self._company_by_domain.get(self._extract_domain(url), "") for url in urls}
+
+    async def _fetch_companies_async(self, urls: List[str]) -> List[str]:
+        semaphore = asyncio.Semaphore(URL_FETCH_CONCURRENCY)
+        async with httpx.AsyncClient(
+            timeout=5.0,
+            follow_redirects=True,
+            headers={"User-Agent": "Mozilla/5.0"},
+            limits=httpx.Limits(max_connections=32),
+        ) as client:
+            async def fetch(url: str) -> str:
+                async with semaphore:
+                    try:
+                        r = await client.get(url)
+                        if r.status_code >= 400:
+                            return ""
+                        return self._company_from_html(r.text or "")
+                    except Exception:
+                        return ""
+            return await asyncio.gather(*[fetch(u) for u in urls])
 
+    def _company_from_html(self, html: str) -> str:
         # <title>を抽出
-        m = re.search(r"<title[^>]*>(.*?)</title>", html, re.IGNORECASE | re.DOTALL)
+        m = TITLE_PATTERN.search(html)
         if not m:
             return ""
         title = m.group(1)
@@ -483,13 +712,12 @@ class ExcelIngestor:
         # 企業名っぽいトークン抽出
         candidate = title
         # 株式会社/有限会社/合同会社のいずれかが含まれていればその前後を採用
-        corp_patterns = [r"([^\s]+株式会社)", r"([^\s]+有限会社)", r"([^\s]+合同会社)"]
-        for p in corp_patterns:
-            mm = re.search(p, candidate)
+        for pattern in CORP_NAME_PATTERNS:
+            mm = pattern.search(candidate)
             if mm:
                 return mm.group(1).strip()
         # それ以外は長めの日本語文字列を返す
-        mm2 = re.search(r"([ぁ-んァ-ン一-龯]{3,})", candidate)
+        mm2 = JAPANESE_NAME_PATTERN.search(candidate)
         if mm2:
             return mm2.group(1).strip()
-        return ""
\ No newline at end of file
+        return ""
@@ -0,0 +1,77 @@
+"""
+ONNX Runtime（int8 動的量子化）でローカル推論する埋め込みモジュール。
+大量インデックス時に Gemini API への往復をなくすためのもの（RAG_EMBEDDING_PROVIDER=onnx で有効化）。
+optimum[onnxruntime] / transformers は任意依存のため、使用時にのみ読み込む。
+"""
+
+import logging
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+from config import CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+class LocalEmbeddings:
+    """LangChain互換のローカル埋め込みクラス（embed_documents / embed_query）。
+
+    Gemini とはベクトル次元が異なるため、プロバイダを切り替えた場合は再インデックスが必要。
+    """
+
+    def __init__(self, model_name: str = CONFIG.RAG_LOCAL_EMBEDDING_MODEL, batch_size: int = 64):
+        try:
+            from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+            from optimum.onnxruntime.configuration import AutoQuantizationConfig
+            from transformers import AutoTokenizer
+        except ImportError as e:
+            raise ValueError(f"optimum[onnxruntime] or transformers not available: {e}")
+
+        self.model_name = model_name
+        self.batch_size = batch_size
+
+        # 量子化済みモデルは CHROMA_STORE_DIR 配下に保存し、次回以降は再変換しない
+        model_dir = Path(CONFIG.CHROMA_STORE_DIR) / "onnx_models" / model_name.replace("/", "__")
+        quantized_file = "model_quantized.onnx"
+        if not (model_dir / quantized_file).exists():
+            logger.info("ONNX 埋め込みモデルを量子化します: %s", model_name)
+            model = ORTModelForFeatureExtraction.from_pretrained(model_name, export=True)
+            quantizer = ORTQuantizer.from_pretrained(model)
+            quantizer.quantize(
+                save_dir=str(model_dir),
+                quantization_config=AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False),
+            )
+            AutoTokenizer.from_pretrained(model_name).save_pretrained(str(model_dir))
+
+        self.tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+        self.model = ORTModelForFeatureExtraction.from_pretrained(str(model_dir), file_name=quantized_file)
+        logger.info("Using local ONNX embeddings: %s", model_name)
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer(texts, padding=True, truncation=True, return_tensors="np")
+        outputs = self.model(**encoded)
+        hidden = np.asarray(outputs.last_hidden_state, dtype=np.float32)
+        # attention mask を考慮した平均プーリング + L2 正規化
+        mask = encoded["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return pooled / np.clip(norms, 1e-12, None)
+
+    def embed_documents_array(self, texts: List[str]) -> np.ndarray:
+        """埋め込みを (N, D) の float32 配列で返す。"""
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        batches = [self._encode(texts[i:i + self.batch_size]) for i in range(0, len(texts), self.batch_size)]
+        return np.vstack(batches)
+
+    def embed_query_array(self, text: str) -> np.ndarray:
+        """クエリ埋め込みを (D,) の float32 配列で返す。"""
+        return self._encode([text])[0]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_documents_array(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_query_array(text).tolist()
@@ -1,26 +1,53 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
-from typing import List, Optional, cast, Dict, Any
+from typing import List, Optional, cast, Dict, Any, Tuple
+import asyncio
+import atexit
+import logging
+import logging.handlers
 import os
-import shutil
+import queue
+import sys
 from pathlib import Path
 
+import aiofiles
+from cachetools import TTLCache
+
 # 追加のインポート
+from google.api_core.exceptions import GoogleAPICallError
 from langchain_google_genai import ChatGoogleGenerativeAI
 from pydantic.v1 import SecretStr
 
-from config import Config
+from config import CONFIG
 from rag_service import RAGService
-from ingest_excel import ExcelIngestor
+from ingest_excel import ExcelIngestor, EXCEL_ENGINE
 from retriever import EnhancedRetriever
-import time
+from utils.async_utils import SingleFlight
 import random
 import re
 import pandas as pd
 
-app = FastAPI(title="RAG Chatbot API", version="1.0.0")
+# ログ出力（既存の print と同じ "LEVEL: メッセージ" 形式）
+# リクエスト処理側はキューに積むだけにし、標準エラーへの書き込みは QueueListener のスレッドで行う
+def _setup_logging() -> logging.handlers.QueueListener:
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(logging.Formatter("%(levelname)s: %(message)s"))
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+_log_listener = _setup_logging()
+logger = logging.getLogger("backend.main")
+
+app = FastAPI(title="RAG Chatbot API", version="1.0.0", default_response_class=ORJSONResponse)
 
 # =========================
 # CORS 設定（本番 + ローカル）
@@ -44,28 +71,62 @@ app.add_middleware(
     expose_headers=["X-Request-ID"],            # 返したい独自ヘッダがあれば
 )
 
+# 1KB 以上のレスポンス（LLM の回答や検索結果）を gzip 圧縮して返す
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 # 設定とサービスの初期化
-config = Config()
+config = CONFIG
 rag_service = None
 excel_ingestor = None
 enhanced_retriever = None
+# /search と /api/ask で共有する LLM クライアント（リクエストごとに生成しない）
+llm_client: Optional[ChatGoogleGenerativeAI] = None
+
+def _create_llm_client() -> ChatGoogleGenerativeAI:
+    return ChatGoogleGenerativeAI(
+        model=config.GEMINI_CHAT_MODEL,
+        google_api_key=SecretStr(config.GEMINI_API_KEY),
+        temperature=0.2,
+        top_p=0.9,
+        client_options=None,
+        transport=None,
+        client=None,
+    )
+
+# 同じプロンプトの LLM 呼び出しが同時に来た場合は1回にまとめて結果を共有する
+_llm_single_flight = SingleFlight()
+
+async def _invoke_llm(prompt: str) -> Any:
+    """共有 LLM クライアントでプロンプトを実行し、応答本文を返す"""
+    if llm_client is None:
+        raise ValueError("GEMINI_API_KEY が設定されていません")
+    client = llm_client
+
+    async def call() -> Any:
+        return (await client.ainvoke(prompt)).content
+
+    return await _llm_single_flight.run(prompt, call)
 
 @app.on_event("startup")
 async def startup_event():
     """アプリケーション起動時の初期化処理"""
-    global rag_service, excel_ingestor, enhanced_retriever
+    global rag_service, excel_ingestor, enhanced_retriever, llm_client
     try:
         rag_service = RAGService()
         excel_ingestor = ExcelIngestor()
         enhanced_retriever = EnhancedRetriever()
-        print("INFO: All services initialized successfully")
+        if config.GEMINI_API_KEY:
+            llm_client = _create_llm_client()
+        logger.info("All services initialized successfully")
     except Exception as e:
-        print(f"ERROR: Failed to initialize services: {e}")
+        logger.error("Failed to initialize services: %s", e)
         raise
 
 # データディレクトリの作成
 data_dir = Path(config.DATA_DIR)
 data_dir.mkdir(parents=True, exist_ok=True)
+# アップロードを書き込む際の1回あたりの読み込みサイズ（1 MiB）
+UPLOAD_CHUNK_SIZE = 1 << 20
 
 # Pydanticモデル
 class ChatRequest(BaseModel):
@@ -112,6 +173,9 @@ class CompanyByRowResponse(BaseModel):
     row_id: Optional[int] = None
     message: Optional[str] = None
 
+# セル参照（例：A2）の形式
+CELL_REF_PATTERN = re.compile(r'^([A-Z]+)(\d+)$')
+
 def parse_row_from_cell(cell: str) -> int:
     """
     セル参照（例：A2, B10）から行番号を抽出
@@ -122,9 +186,10 @@ def parse_row_from_cell(cell: str) -> int:
     Raises:
         ValueError: 不正なセル参照の場合
     """
+    cell = (cell or "").strip()
     if not cell:
         raise ValueError("セル参照が空です")
-    match = re.match(r'^([A-Z]+)(\d+)$', cell.upper())
+    match = CELL_REF_PATTERN.match(cell.upper())
     if not match:
         raise ValueError(f"不正なセル参照形式: {cell}")
     col_letters, row_str = match.groups()
@@ -144,10 +209,40 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
-# Gemini ヘルスチェック
+# Gemini ヘルスチェック（キーの有無は起動時の設定から一度だけ求める）
+HAS_GEMINI_KEY = bool(config.GEMINI_API_KEY)
+
 @app.get("/gemini/health")
 async def gemini_health():
-    return {"ok": bool(os.getenv("GEMINI_API_KEY"))}
+    return {"ok": HAS_GEMINI_KEY}
+
+def _copy_file_range(src_fd: int, dest: Path, size: int) -> int:
+    """アップロードの一時ファイルからカーネル内コピー（copy_file_range）で書き出す"""
+    copied = 0
+    with open(dest, "wb") as f:
+        while copied < size:
+            n = os.copy_file_range(src_fd, f.fileno(), size - copied, offset_src=copied)
+            if n == 0:
+                break
+            copied += n
+    return copied
+
+async def _save_upload(file: UploadFile, dest: Path) -> int:
+    """アップロード内容を dest に保存し、書き込んだバイト数を返す"""
+    # Linux でディスクに退避済みの大きなアップロードは、ユーザー空間を経由せずにコピーする
+    if sys.platform == "linux" and hasattr(os, "copy_file_range") and (file.size or 0) > UPLOAD_CHUNK_SIZE:
+        try:
+            return await asyncio.to_thread(_copy_file_range, file.file.fileno(), dest, file.size)
+        except OSError as e:
+            logger.warning("copy_file_range に失敗したため通常の書き込みに切り替えます: %s", e)
+            await file.seek(0)
+
+    size = 0
+    async with aiofiles.open(dest, "wb") as f:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            await f.write(chunk)
+    return size
 
 @app.post("/upload", response_model=UploadResponse)
 async def upload_file(file: UploadFile = File(...)):
@@ -157,38 +252,76 @@ async def upload_file(file: UploadFile = File(...)):
             raise HTTPException(status_code=400, detail="Filename is required")
         filename = cast(str, file.filename)
 
-        content = await file.read()
-        if not content:
-            raise HTTPException(status_code=400, detail="File is empty")
-
         file_extension = Path(filename).suffix.lower()
         if file_extension not in config.ALLOWED_EXTENSIONS:
-            raise HTTPException(status_code=400, detail=f"Unsupported file type. Allowed: {config.ALLOWED_EXTENSIONS}")
+            raise HTTPException(status_code=400, detail=f"Unsupported file type. Allowed: {', '.join(sorted(config.ALLOWED_EXTENSIONS))}")
 
-        file_path = data_dir / filename
-        with open(file_path, "wb") as f:
-            f.write(content)
+        # サイズが分かっている空ファイルは書き込み前に弾く
+        if file.size == 0:
+            raise HTTPException(status_code=400, detail="File is empty")
 
-        print(f"INFO: POST /upload -> 200 (saved: {filename})")
+        # 全体をメモリに載せず、一定サイズずつ一時ファイルへ非同期に書き込んでから置き換える
+        file_path = data_dir / filename
+        tmp_path = file_path.with_name(file_path.name + ".part")
+        try:
+            size = await _save_upload(file, tmp_path)
+            if size == 0:
+                raise HTTPException(status_code=400, detail="File is empty")
+            os.replace(tmp_path, file_path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+        logger.info("POST /upload -> 200 (saved: %s)", filename)
         return UploadResponse(status="success", message=f"File {filename} uploaded successfully", filename=filename)
 
     except HTTPException:
         raise
     except Exception as e:
-        print(f"ERROR: POST /upload -> 500 ({e})")
+        logger.error("POST /upload -> 500 (%s)", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/ingest", response_model=IngestResponse)
 async def ingest_documents():
     try:
         if rag_service is None:
-            return JSONResponse(status_code=500, content={"error": "RAG service not initialized", "detail": "Service initialization failed"})
-        result = rag_service.ingest_documents()
-        print(f"INFO: POST /ingest -> 200")
+            return ORJSONResponse(status_code=500, content={"error": "RAG service not initialized", "detail": "Service initialization failed"})
+        result = await asyncio.to_thread(rag_service.ingest_documents)
+        _invalidate_ask_cache()
+        logger.info("POST /ingest -> 200")
         return IngestResponse(**result)
     except Exception as e:
-        print(f"ERROR: POST /ingest -> 500 ({e})")
-        return JSONResponse(status_code=500, content={"error": "Ingestion failed", "detail": str(e)})
+        logger.error("POST /ingest -> 500 (%s)", e)
+        return ORJSONResponse(status_code=500, content={"error": "Ingestion failed", "detail": str(e)})
+
+# =========================
+# LLM プロンプトの固定部分（リクエストごとに組み立て直さない）
+# =========================
+SEARCH_PROMPT_PREFIX = (
+    "あなたは営業支援AIです。以下の社内ドキュメントに基づいて、ユーザーの質問に日本語で簡潔に回答してください。"
+    "\n\n【質問】\n"
+)
+SEARCH_PROMPT_SUFFIX = "\n\n【要件】\n- 根拠となる情報のみを使用\n- 不明な点は不明と述べる\n- 箇条書きで要点を整理"
+SEARCH_FALLBACK_PROMPT_PREFIX = (
+    "アップロードされたドキュメントから該当情報は見つかりませんでした。"
+    "以下の質問に対して、一般知識の範囲で日本語で簡潔に補足回答してください。"
+    "\n\n【質問】\n"
+)
+SEARCH_FALLBACK_PROMPT_SUFFIX = "\n\n【要件】\n- 具体的かつ実用的な提案\n- 根拠が弱い場合は前提条件を明示"
+
+ASK_SYSTEM_INSTRUCTION = """あなたは営業支援AIアシスタントです。架電リストの企業データベースから情報を抽出し、営業活動を支援してください。
+
+【重要な指示】
+- 与えられたコンテキストのみを根拠に回答してください
+- 回答には必ず「企業名」と「リードステータス」を含めてください
+- 根拠が不十分な場合は「わからない」と明記してください
+- 推測や憶測は避け、事実のみを提供してください
+
+【回答形式】
+企業名: [企業名]
+リードステータス: [ステータス]
+その他の情報: [関連情報]"""
+ASK_PROMPT_PREFIX = ASK_SYSTEM_INSTRUCTION + "\n\n"
 
 @app.post("/search")
 async def search(req: SearchRequest):
@@ -196,12 +329,12 @@ async def search(req: SearchRequest):
     try:
         q = (req.query or "").strip()
         if not q:
-            return JSONResponse(status_code=400, content={"error": "query is required"})
+            return ORJSONResponse(status_code=400, content={"error": "query is required"})
 
         if enhanced_retriever is None:
-            return JSONResponse(status_code=500, content={"error": "retriever not initialized"})
+            return ORJSONResponse(status_code=500, content={"error": "retriever not initialized"})
 
-        docs = enhanced_retriever.hybrid_search(q, row_id_filter=req.row_id, top_k=5, score_threshold=0.60)
+        docs = await asyncio.to_thread(enhanced_retriever.hybrid_search, q, row_id_filter=req.row_id, top_k=5, score_threshold=0.60)
         top_docs = docs[:3]
 
         results = [
@@ -212,68 +345,76 @@ async def search(req: SearchRequest):
             for d in top_docs
         ]
 
-        if not config.GEMINI_API_KEY:
-            raise ValueError("GEMINI_API_KEY が設定されていません")
-        llm = ChatGoogleGenerativeAI(
-            model=config.GEMINI_CHAT_MODEL,
-            google_api_key=SecretStr(config.GEMINI_API_KEY),
-            temperature=0.2,
-            top_p=0.9,
-            client_options=None,
-            transport=None,
-            client=None,
-        )
-
         if results:
             context = "\n\n".join([r["content"] for r in results])
-            prompt = (
-                "あなたは営業支援AIです。以下の社内ドキュメントに基づいて、ユーザーの質問に日本語で簡潔に回答してください。"
-                "\n\n【質問】\n" + q + "\n\n【社内ドキュメント】\n" + context + "\n\n【要件】\n- 根拠となる情報のみを使用\n- 不明な点は不明と述べる\n- 箇条書きで要点を整理"
-            )
-            answer = llm.invoke(prompt).content
-            print("INFO: POST /search -> 200 (with results)")
+            prompt = f"{SEARCH_PROMPT_PREFIX}{q}\n\n【社内ドキュメント】\n{context}{SEARCH_PROMPT_SUFFIX}"
+            answer = await _invoke_llm(prompt)
+            logger.info("POST /search -> 200 (with results)")
             return {"status": "ok", "results": results, "answer": answer}
         else:
-            prompt = (
-                "アップロードされたドキュメントから該当情報は見つかりませんでした。"
-                "以下の質問に対して、一般知識の範囲で日本語で簡潔に補足回答してください。"
-                "\n\n【質問】\n" + q + "\n\n【要件】\n- 具体的かつ実用的な提案\n- 根拠が弱い場合は前提条件を明示"
-            )
-            answer = llm.invoke(prompt).content
-            print("INFO: POST /search -> 200 (fallback)")
+            prompt = f"{SEARCH_FALLBACK_PROMPT_PREFIX}{q}{SEARCH_FALLBACK_PROMPT_SUFFIX}"
+            answer = await _invoke_llm(prompt)
+            logger.info("POST /search -> 200 (fallback)")
             return {"status": "ok", "results": [], "answer": answer, "fallback": True}
 
     except Exception as e:
-        print(f"ERROR: POST /search -> 500 ({e})")
-        return JSONResponse(status_code=500, content={"error": "Search failed", "detail": str(e)})
+        logger.error("POST /search -> 500 (%s)", e)
+        return ORJSONResponse(status_code=500, content={"error": "Search failed", "detail": str(e)})
+
+# 検索・LLM を呼ぶ前の入力チェックと、チャット系リクエストの同時実行数の上限（超過時は待たずに 429）
+MIN_QUERY_LENGTH = 2
+_chat_semaphore = asyncio.Semaphore(config.RAG_MAX_CONCURRENT_CHATS)
+
+def _validate_message(message: str) -> Optional[ORJSONResponse]:
+    if not message:
+        return ORJSONResponse(status_code=400, content={"error": "Message cannot be empty"})
+    if len(message) < MIN_QUERY_LENGTH:
+        return ORJSONResponse(status_code=400, content={"error": "Message is too short", "detail": f"{MIN_QUERY_LENGTH}文字以上で入力してください"})
+    if len(message) > config.RAG_MAX_QUERY_LENGTH:
+        return ORJSONResponse(status_code=400, content={"error": "Message is too long", "detail": f"{config.RAG_MAX_QUERY_LENGTH}文字以内で入力してください"})
+    return None
+
+def _too_many_chats() -> ORJSONResponse:
+    logger.warning("チャットの同時実行数が上限に達したためリクエストを拒否")
+    return ORJSONResponse(status_code=429, content={"error": "Too many requests", "detail": "混雑しています。しばらく後に再試行してください。"})
 
 @app.post("/api/ask", response_model=AskResponse)
 async def ask(request: ChatRequest):
     try:
-        if not request.message.strip():
-            raise HTTPException(status_code=400, detail="Message cannot be empty")
+        message = request.message.strip()
+        error = _validate_message(message)
+        if error is not None:
+            return error
         if enhanced_retriever is None:
-            return JSONResponse(status_code=500, content={"error": "Enhanced retriever not initialized", "detail": "Service initialization failed"})
-        result = await enhanced_chat_with_retry(request.message)
-        print("INFO: POST /api/ask -> 200")
+            return ORJSONResponse(status_code=500, content={"error": "Enhanced retriever not initialized", "detail": "Service initialization failed"})
+        if _chat_semaphore.locked():
+            return _too_many_chats()
+        async with _chat_semaphore:
+            result = await enhanced_chat_with_retry(message)
+        logger.info("POST /api/ask -> 200")
         return AskResponse(**result)
     except Exception as e:
-        print(f"ERROR: POST /api/ask -> 500 ({e})")
-        return JSONResponse(status_code=500, content={"error": "Ask failed", "detail": str(e)})
+        logger.error("POST /api/ask -> 500 (%s)", e)
+        return ORJSONResponse(status_code=500, content={"error": "Ask failed", "detail": str(e)})
 
 @app.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     try:
-        if not request.message.strip():
-            raise HTTPException(status_code=400, detail="Message cannot be empty")
+        message = request.message.strip()
+        error = _validate_message(message)
+        if error is not None:
+            return error
         if rag_service is None:
-            return JSONResponse(status_code=500, content={"error": "RAG service not initialized", "detail": "Service initialization failed"})
-        result = rag_service.chat(request.message)
-        print("INFO: POST /chat -> 200")
+            return ORJSONResponse(status_code=500, content={"error": "RAG service not initialized", "detail": "Service initialization failed"})
+        if _chat_semaphore.locked():
+            return _too_many_chats()
+        async with _chat_semaphore:
+            result = await asyncio.to_thread(rag_service.chat, message)
+        logger.info("POST /chat -> 200")
         return ChatResponse(**result)
     except Exception as e:
-        print(f"ERROR: POST /chat -> 500 ({e})")
-        return JSONResponse(status_code=500, content={"error": "Chat failed", "detail": str(e)})
+        logger.error("POST /chat -> 500 (%s)", e)
+        return ORJSONResponse(status_code=500, content={"error": "Chat failed", "detail": str(e)})
 
 class PruneRequest(BaseModel):
     keep_contains: str
@@ -289,23 +430,58 @@ async def prune_index(req: PruneRequest):
         if not req.keep_contains:
             raise HTTPException(status_code=400, detail="keep_contains is required")
         if rag_service is None:
-            return JSONResponse(status_code=500, content={"error": "RAG service not initialized", "detail": "Service initialization failed"})
+            return ORJSONResponse(status_code=500, content={"error": "RAG service not initialized", "detail": "Service initialization failed"})
         result = rag_service.prune_index_except(req.keep_contains)
-        print("INFO: POST /prune-index -> 200")
+        _invalidate_ask_cache()
+        logger.info("POST /prune-index -> 200")
         return PruneResponse(**result)
     except Exception as e:
-        print(f"ERROR: POST /prune-index -> 500 ({e})")
-        return JSONResponse(status_code=500, content={"error": "Prune operation failed", "detail": str(e)})
+        logger.error("POST /prune-index -> 500 (%s)", e)
+        return ORJSONResponse(status_code=500, content={"error": "Prune operation failed", "detail": str(e)})
+
+# リトライ対象とする LLM エラー（レート制限・サーバー側の一時的な障害・タイムアウト）
+RETRYABLE_LLM_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+LLM_RETRY_MAX_WAIT = 10.0
+
+def _is_retryable_llm_error(e: BaseException) -> bool:
+    """例外（LangChain がラップした元の例外を含む）が一時的なエラーかどうか"""
+    while e is not None:
+        if isinstance(e, (TimeoutError, asyncio.TimeoutError)):
+            return True
+        if isinstance(e, GoogleAPICallError) and e.code in RETRYABLE_LLM_STATUS_CODES:
+            return True
+        e = e.__cause__
+    return False
+
+# /api/ask の回答キャッシュ（同じ質問の検索・LLM 呼び出しを省略）。インデックス更新時に世代を進めて無効化する
+ASK_CACHE_TTL_SECONDS = 300
+_ask_cache: TTLCache = TTLCache(maxsize=1024, ttl=ASK_CACHE_TTL_SECONDS)
+_index_generation = 0
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+def _invalidate_ask_cache():
+    """インデックスが変わったので、以前の世代で作られた回答キャッシュを使わないようにする"""
+    global _index_generation
+    _index_generation += 1
+    _ask_cache.clear()
 
 async def enhanced_chat_with_retry(message: str, max_retries: int = 3) -> Dict[str, Any]:
-    from langchain_google_genai import ChatGoogleGenerativeAI
-    from pydantic.v1 import SecretStr
-
+    key = (WHITESPACE_PATTERN.sub(" ", message).strip().lower(), config.GEMINI_CHAT_MODEL, _index_generation)
+    cached = _ask_cache.get(key)
+    if cached is not None:
+        return {**cached, "meta": {**cached["meta"], "cache_hit": True}}
+    result = await _enhanced_chat_with_retry(message, max_retries)
+    # 成功した回答のみキャッシュする（処理中にインデックスが更新されていれば古い世代のキーになり参照されない）
+    if result["status"] == "ok":
+        _ask_cache[key] = result
+    return result
+
+async def _enhanced_chat_with_retry(message: str, max_retries: int = 3) -> Dict[str, Any]:
     for attempt in range(max_retries):
         try:
             if enhanced_retriever is None:
                 return {"status": "error", "answer": None, "items": [], "sources": [], "message": "検索サービスが初期化されていません。", "reason": "service_not_initialized", "meta": {"search_attempt": attempt + 1}}
-            docs = enhanced_retriever.hybrid_search(message, row_id_filter=None)
+            docs = await asyncio.to_thread(enhanced_retriever.hybrid_search, message, row_id_filter=None)
             if not docs:
                 return {"status": "error", "answer": None, "items": [], "sources": [], "message": "関連する社内ドキュメントが見つかりませんでした。", "reason": "no_context", "meta": {"search_attempt": attempt + 1}}
             context_parts = []
@@ -343,18 +519,6 @@ async def enhanced_chat_with_retry(message: str, max_retries: int = 3) -> Dict[s
                     context_parts.append(f"{i}. {doc.page_content}")
             context = "\n".join(context_parts)
 
-            system_instruction = """あなたは営業支援AIアシスタントです。架電リストの企業データベースから情報を抽出し、営業活動を支援してください。
-
-【重要な指示】
-- 与えられたコンテキストのみを根拠に回答してください
-- 回答には必ず「企業名」と「リードステータス」を含めてください
-- 根拠が不十分な場合は「わからない」と明記してください
-- 推測や憶測は避け、事実のみを提供してください
-
-【回答形式】
-企業名: [企業名]
-リードステータス: [ステータス]
-その他の情報: [関連情報]"""
             user_prompt = f"""【質問】
 {message}
 
@@ -362,28 +526,16 @@ async def enhanced_chat_with_retry(message: str, max_retries: int = 3) -> Dict[s
 {context}
 
 上記の情報を基に、質問に対して正確に回答してください。"""
-            if not config.GEMINI_API_KEY:
-                raise ValueError("GEMINI_API_KEY が設定されていません")
-            llm = ChatGoogleGenerativeAI(
-                model=config.GEMINI_CHAT_MODEL,
-                google_api_key=SecretStr(config.GEMINI_API_KEY),
-                temperature=0.2,
-                top_p=0.9,
-                client_options=None,
-                transport=None,
-                client=None
-            )
-            response = llm.invoke(f"{system_instruction}\n\n{user_prompt}")
-            answer = response.content
+            answer = await _invoke_llm(ASK_PROMPT_PREFIX + user_prompt)
             return {"status": "ok", "answer": answer, "items": items, "sources": sources, "message": None, "reason": None, "meta": {"documents_found": len(docs), "search_attempt": attempt + 1, "llm_model": config.GEMINI_CHAT_MODEL}}
         except Exception as e:
             error_msg = str(e)
-            if "429" in error_msg or "5" in error_msg[:1] or "timeout" in error_msg.lower():
+            if _is_retryable_llm_error(e):
                 if attempt < max_retries - 1:
-                    wait_time = (2 ** attempt) + random.uniform(0, 1)
-                    print(f"WARNING: LLM エラー（試行 {attempt + 1}/{max_retries}）: {error_msg}")
-                    print(f"INFO: {wait_time:.2f}秒待機後にリトライします...")
-                    time.sleep(wait_time)
+                    wait_time = min((2 ** attempt) + random.uniform(0, 1), LLM_RETRY_MAX_WAIT)
+                    logger.warning("LLM エラー（試行 %s/%s）: %s", attempt + 1, max_retries, error_msg)
+                    logger.info("%.2f秒待機後にリトライします...", wait_time)
+                    await asyncio.sleep(wait_time)
                     continue
                 else:
                     return {"status": "error", "answer": None, "items": [], "sources": [], "message": "LLMサービスが利用できません。しばらく後に再試行してください。", "reason": "llm_unavailable", "meta": {"max_retries_exceeded": True, "last_error": error_msg}}
@@ -396,23 +548,24 @@ async def ingest_excel():
     """Excel ファイルをインデックス化"""
     try:
         if excel_ingestor is None:
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=500,
                 content={"error": "Excel ingestor not initialized", "detail": "Service initialization failed"}
             )
 
         excel_path = Path(config.DATA_DIR) / "rag用_架電リスト.xlsx"
         if not excel_path.exists():
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=404,
                 content={"error": "Excel file not found", "detail": f"Excel ファイルが見つかりません: {excel_path}"}
             )
 
-        result = excel_ingestor.ingest_excel_file(str(excel_path))
+        result = await asyncio.to_thread(excel_ingestor.ingest_excel_file, str(excel_path))
+        _invalidate_ask_cache()
         return result
 
     except Exception as e:
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=500,
             content={"error": "Excel ingestion failed", "detail": str(e)}
         )
@@ -422,18 +575,63 @@ async def get_search_stats():
     """検索統計情報を取得"""
     try:
         if enhanced_retriever is None:
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=500,
                 content={"error": "Enhanced retriever not initialized", "detail": "Service initialization failed"}
             )
         stats = enhanced_retriever.get_search_statistics()
         return stats
     except Exception as e:
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=500,
             content={"error": "Stats retrieval failed", "detail": str(e)}
         )
 
+def _load_company_sheet(excel_path: Path) -> pd.DataFrame:
+    """架電リストを読み込み、ヘッダー整形と row_id 付与まで行った DataFrame を返す"""
+    df_raw = pd.read_excel(str(excel_path), engine=EXCEL_ENGINE, dtype=str, header=None)
+    df_raw = df_raw.fillna("")
+
+    if len(df_raw) < 2:
+        raise HTTPException(status_code=400, detail="Excelファイルのデータが不十分です")
+
+    header_row = df_raw.iloc[0].tolist()
+    processed_header = []
+    for i, cell_value in enumerate(header_row):
+        if cell_value and cell_value.strip():
+            processed_header.append(cell_value.strip())
+        else:
+            col_letter = chr(ord('A') + i)
+            processed_header.append(f"列{col_letter}")
+
+    # データ行の配列から直接組み立て、コピー・reset_index・set_index による全体の複製を避ける
+    n_rows = len(df_raw) - 1
+    df = pd.DataFrame(df_raw.to_numpy()[1:], columns=processed_header)
+    del df_raw
+    df.insert(0, 'index', range(1, n_rows + 1))
+    df['row_id'] = range(2, n_rows + 2)
+    # row_id で直接引けるようにインデックス化（列としても残す）
+    df.index = pd.Index(df['row_id'], name='row_id')
+    return df
+
+# 読み込み済みの架電リスト（キー: (パス, 更新時刻ns)）。ファイルが更新されたら読み直す
+_company_sheet_cache: Dict[Tuple[str, int], pd.DataFrame] = {}
+_company_sheet_lock = asyncio.Lock()
+
+async def _get_company_sheet(excel_path: Path) -> pd.DataFrame:
+    key = (str(excel_path), excel_path.stat().st_mtime_ns)
+    df = _company_sheet_cache.get(key)
+    if df is not None:
+        return df
+    # 同時リクエストで同じファイルを重複して読み込まないようにする
+    async with _company_sheet_lock:
+        df = _company_sheet_cache.get(key)
+        if df is None:
+            df = await asyncio.to_thread(_load_company_sheet, excel_path)
+            _company_sheet_cache.clear()
+            _company_sheet_cache[key] = df
+    return df
+
 @app.get("/company/by-cell", response_model=CompanyByRowResponse)
 async def get_company_by_cell(cell: str):
     """
@@ -450,40 +648,19 @@ async def get_company_by_cell(cell: str):
             raise HTTPException(status_code=404, detail=f"Excelファイルが見つかりません: {excel_path}")
 
         try:
-            df_raw = pd.read_excel(str(excel_path), engine='openpyxl', dtype=str, header=None)
-            df_raw = df_raw.fillna("")
-
-            if len(df_raw) < 2:
-                raise HTTPException(status_code=400, detail="Excelファイルのデータが不十分です")
-
-            header_row = df_raw.iloc[0].tolist()
-            processed_header = []
-            for i, cell_value in enumerate(header_row):
-                if cell_value and cell_value.strip():
-                    processed_header.append(cell_value.strip())
-                else:
-                    col_letter = chr(ord('A') + i)
-                    processed_header.append(f"列{col_letter}")
-
-            df = df_raw.iloc[1:].copy()
-            df.columns = processed_header
-
-            df = df.reset_index().assign(row_id=lambda d: d.index + 2)
-            matching_rows = df[df['row_id'] == row_id]
-
-            if matching_rows.empty:
+            df = await _get_company_sheet(excel_path)
+            try:
+                row_data = df.loc[row_id]
+            except KeyError:
                 raise HTTPException(status_code=404, detail=f"行番号 {row_id} のデータが見つかりません")
 
-            row_data = matching_rows.iloc[0]
-
-            company_data = {}
-            for col_name in df.columns:
-                if col_name != 'index':
-                    value = row_data[col_name]
-                    if pd.notna(value) and str(value).strip() and str(value) != 'nan':
-                        company_data[col_name] = str(value).strip()
+            # 空・NaN の列を除いた値を列単位でまとめて抽出
+            row_data = row_data.drop('index')
+            raw_values = row_data.astype(str)
+            values = raw_values.str.strip()
+            company_data = values[row_data.notna() & values.ne('') & raw_values.ne('nan')].to_dict()
 
-            print(f"INFO: GET /company/by-cell -> 200 (cell={cell}, row_id={row_id})")
+            logger.info("GET /company/by-cell -> 200 (cell=%s, row_id=%s)", cell, row_id)
             return CompanyByRowResponse(
                 status="success",
                 company_data=company_data,
@@ -491,14 +668,16 @@ async def get_company_by_cell(cell: str):
                 message=f"行 {row_id} のデータを正常に取得しました"
             )
 
+        except HTTPException:
+            raise
         except Exception as e:
-            print(f"ERROR: Excelファイル処理エラー: {e}")
+            logger.error("Excelファイル処理エラー: %s", e)
             raise HTTPException(status_code=500, detail=f"Excelファイルの処理中にエラーが発生しました: {str(e)}")
 
     except HTTPException:
         raise
     except Exception as e:
-        print(f"ERROR: GET /company/by-cell -> 500 ({e})")
+        logger.error("GET /company/by-cell -> 500 (%s)", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 if __name__ == "__main__":
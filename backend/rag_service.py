@@ -1,5 +1,11 @@
 import os
-from typing import List, Dict, Any, Optional
+import logging
+import re
+import uuid
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 from pathlib import Path
 import chromadb
 from chromadb.config import Settings
@@ -9,22 +15,87 @@ from langchain_google_genai import ChatGoogleGenerativeAI
 from pydantic.v1 import SecretStr
 from langchain_community.document_loaders import PyPDFLoader, TextLoader
 from langchain_community.vectorstores import Chroma
-from config import Config
+from config import CONFIG, LEADS_COLLECTION_METADATA
+import numpy as np
 import pandas as pd
-from gemini import GeminiEmbeddings
+from pandas.api.types import is_string_dtype
+from gemini import get_embeddings
+from ingest_excel import EXCEL_ENGINE, fill_merged_cells
 from retriever import EnhancedRetriever
+from reranker import get_reranker
+from utils.tokens import count_tokens, truncate_tokens
+from utils.chroma_json import install_orjson_metadata_codec
+
+# キーワード検索の複数語カウント（pyahocorasick があれば優先し、無ければ pandas の str.count）
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Chroma へのメタデータ書き込みを orjson でシリアライズする
+install_orjson_metadata_codec()
+
+logger = logging.getLogger(__name__)
+
+# ファイルの読み込み・分割を並列に行うスレッド数の上限
+INGEST_LOAD_WORKERS = 8
+
+# prune_index_except で1回に取得・削除する件数
+PRUNE_PAGE_SIZE = 1000
+
+# キーワード検索で検索語を区切る文字（改行・タブ・句読点・空白・コロンなど）
+KEYWORD_SEPARATOR_PATTERN = re.compile(r'[\n\t、。，,．. 　;：:]+')
+
+# コンテキスト整形時に先頭へ並べる企業情報の項目（この順で出力する）
+PRIORITY_COMPANY_FIELDS = ("企業名", "代表電話", "直通番号", "従業員数", "リードステータス", "架電者", "架電ログ", "社内メモ")
+PRIORITY_COMPANY_FIELD_SET = frozenset(PRIORITY_COMPANY_FIELDS)
+
+
+@lru_cache(maxsize=32)
+def _compile_row_formatter(columns: Tuple[Any, ...]) -> Callable[[Tuple[str, ...]], str]:
+    """列構成に特化した「1行 → テキスト」関数を生成する（列ごとの処理を展開し、ループと参照を減らす）。
+
+    列名はソースに埋め込まず名前空間の定数として渡すため、任意の列名でも安全に生成できる。
+    """
+    namespace: Dict[str, Any] = {}
+    lines = ["def _row_to_text(values):", "    parts = []"]
+    for i, col in enumerate(columns):
+        namespace[f"_col{i}"] = col
+        namespace[f"_label{i}"] = f"{col}: "
+        # カラム名自体がデータとして含まれていないかチェック
+        lines += [
+            f"    v = values[{i}]",
+            f"    if v.strip() and v != 'nan' and v != _col{i}:",
+            f"        parts.append(_label{i} + v.strip())",
+        ]
+    lines.append("    return ' | '.join(parts)")
+    exec("\n".join(lines), namespace)
+    return namespace["_row_to_text"]
+
+
+# プロセスプールのワーカー内で使い回す読み込み専用インスタンス
+_worker_loader: Optional["RAGService"] = None
+
+
+def _load_and_split_in_worker(file_path: str) -> Tuple[str, Optional[List[Tuple[str, Optional[int]]]]]:
+    """RAG_INGEST_WORKERS 指定時にワーカープロセスで実行する読み込み・分割処理"""
+    global _worker_loader
+    if _worker_loader is None:
+        _worker_loader = RAGService._document_loader()
+    return _worker_loader._load_and_split(file_path)
+
 
 class RAGService:
     def __init__(self):
-        self.config = Config()
+        self.config = CONFIG
         
         if not self.config.GEMINI_API_KEY:
             raise ValueError("GEMINI_API_KEY が設定されていません。.envファイルに設定してください。")
         
-        print(f"INFO: Using Gemini embeddings: {self.config.GEMINI_EMBEDDING_MODEL}")
-        self.embeddings = GeminiEmbeddings()
+        logger.info("Using Gemini embeddings: %s", self.config.GEMINI_EMBEDDING_MODEL)
+        self.embeddings = get_embeddings()
         
-        print(f"INFO: Using Gemini for chat: {self.config.GEMINI_CHAT_MODEL}")
+        logger.info("Using Gemini for chat: %s", self.config.GEMINI_CHAT_MODEL)
         self.llm = ChatGoogleGenerativeAI(
             model=self.config.GEMINI_CHAT_MODEL,
             google_api_key=SecretStr(self.config.GEMINI_API_KEY),
@@ -35,50 +106,74 @@ class RAGService:
             client=None
         )
         
-        persist_dir = str(Path(self.config.CHROMA_STORE_DIR).resolve())
+        persist_dir = self.config.CHROMA_STORE_DIR
         self.vectorstore = Chroma(
             collection_name="leads",  # この行を追加
             persist_directory=persist_dir,
-            embedding_function=self.embeddings
+            embedding_function=self.embeddings,
+            collection_metadata=LEADS_COLLECTION_METADATA,
         )
         
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=self.config.RAG_CHUNK_SIZE,
-            chunk_overlap=self.config.RAG_CHUNK_OVERLAP,
-            length_function=self._simple_len,
-        )
+        self.text_splitter = self._create_text_splitter()
         
         # EnhancedRetrieverを追加
         self.enhanced_retriever = EnhancedRetriever()
+        # 2段階検索用の再ランキング（RAG_USE_RERANKER=false の場合は None）
+        self.reranker = get_reranker()
+
+        # コレクション件数のキャッシュ（ingest_documents / prune_index_except で破棄する）
+        self._collection_size: Optional[int] = None
+
+        # システム指示は固定なので、プロンプト先頭部分は一度だけ組み立てる
+        system_instructions = self.config.RAG_SYSTEM_INSTRUCTIONS
+        self._prompt_prefix = f"{system_instructions}\n\n" if system_instructions else ""
     
-    def _simple_len(self, text: str) -> int:
-        return len(text)
+    def _create_text_splitter(self) -> RecursiveCharacterTextSplitter:
+        return RecursiveCharacterTextSplitter(
+            chunk_size=self.config.RAG_CHUNK_SIZE,
+            chunk_overlap=self.config.RAG_CHUNK_OVERLAP,
+            # 分割中に何度も呼ばれるため、Python メソッドを挟まず組み込みの len を直接渡す
+            length_function=len,
+        )
+
+    @classmethod
+    def _document_loader(cls) -> "RAGService":
+        """読み込み・分割だけに使うインスタンスを返す（ベクターストアや LLM には接続しない）"""
+        loader = cls.__new__(cls)
+        loader.config = CONFIG
+        loader.text_splitter = loader._create_text_splitter()
+        return loader
+
+    def _tiktoken_len(self, text: str) -> int:
+        return count_tokens(text)
     
     def _load_document(self, file_path: str) -> str:
+        """PDF 以外のファイルを1つのテキストとして読み込む（PDF は _load_and_chunk_pdf でページ単位に処理する）"""
         path = Path(file_path)
         
-        if path.suffix.lower() == '.pdf':
-            loader = PyPDFLoader(str(path))
-            pages = loader.load()
-            return "\n".join([page.page_content for page in pages])
-        elif path.suffix.lower() in ['.txt', '.md', '.markdown']:
+        if path.suffix.lower() in ['.txt', '.md', '.markdown']:
             loader = TextLoader(str(path))
             document = loader.load()
             return document[0].page_content
         elif path.suffix.lower() in ['.csv', '.tsv']:
             delimiter = '\t' if path.suffix.lower() == '.tsv' else (self.config.SPREADSHEET_DELIMITER or ',')
+            text_columns = self.config.SPREADSHEET_TEXT_COLUMNS_TUPLE
             try:
-                df = pd.read_csv(str(path), sep=delimiter, dtype=str, keep_default_na=False)
+                # 対象列だけをパーサ側で読み込む（該当列が1つも無い場合は全列で読み直す）
+                df = pd.read_csv(str(path), sep=delimiter, dtype=str, keep_default_na=False,
+                                 usecols=(lambda c: c in text_columns) if text_columns else None)
+                if text_columns and len(df.columns) == 0:
+                    df = pd.read_csv(str(path), sep=delimiter, dtype=str, keep_default_na=False)
             except Exception as e:
                 raise ValueError(f"Failed to read spreadsheet file {path.name}: {e}")
             text = self._dataframe_to_text(df)
             return text
         elif path.suffix.lower() in ['.xlsx', '.xls']:
             try:
-                print(f"DEBUG: Reading Excel file with merged cell support: {path.name}")
+                logger.debug("Reading Excel file with merged cell support: %s", path.name)
                 
                 # 結合セル対応の読み込み
-                df_raw = pd.read_excel(str(path), engine='openpyxl', dtype=str, header=None)
+                df_raw = pd.read_excel(str(path), engine=EXCEL_ENGINE, dtype=str, header=None)
                 df_raw = df_raw.fillna("")
                 
                 if len(df_raw) < 2:
@@ -101,9 +196,9 @@ class RAGService:
                 # 結合セルの処理（H-L列対応）
                 df = self._process_merged_cells_in_rag(df)
                 
-                print(f"DEBUG: Excel read successful, shape: {df.shape}")
-                print(f"DEBUG: データ行数（ヘッダー除く）: {len(df)}")
-                print(f"DEBUG: Processed columns: {list(df.columns)}")
+                logger.debug("Excel read successful, shape: %s", df.shape)
+                logger.debug("データ行数（ヘッダー除く）: %s", len(df))
+                logger.debug("Processed columns: %s", df.columns.tolist())
                 
             except ImportError as e:
                 raise ValueError(f"pandas or openpyxl not available: {e}")
@@ -115,63 +210,64 @@ class RAGService:
             raise ValueError(f"Unsupported file type: {path.suffix}")
 
     def _dataframe_to_text(self, df: pd.DataFrame) -> str:
-        print(f"DEBUG: DataFrame shape: {df.shape}")
-        print(f"DEBUG: DataFrame columns: {list(df.columns)}")
+        logger.debug("DataFrame shape: %s", df.shape)
+        logger.debug("DataFrame columns: %s", df.columns.tolist())
         
-        columns_env = (self.config.SPREADSHEET_TEXT_COLUMNS or '').strip()
-        if columns_env:
-            requested_columns = [c.strip() for c in columns_env.split(',') if c.strip()]
+        requested_columns = self.config.SPREADSHEET_TEXT_COLUMNS_TUPLE
+        if requested_columns:
             existing_columns = [c for c in requested_columns if c in df.columns]
             use_columns = existing_columns if len(existing_columns) > 0 else list(df.columns)
         else:
             use_columns = list(df.columns)
         
-        print(f"DEBUG: Using columns: {use_columns}")
-
-        df_selected = df[use_columns].astype(str)
-        row_texts = []
-        for idx, row in df_selected.iterrows():
-            row_data = []
-            for col in use_columns:
-                value = row[col]
-                str_value = str(value) if value is not None else ""
-                # カラム名自体がデータとして含まれていないかチェック
-                if str_value.strip() and str_value != 'nan' and str_value != col:
-                    clean_value = str_value.strip()
-                    row_data.append(f"{col}: {clean_value}")
-            if row_data:
-                row_text = " | ".join(row_data)
-                row_texts.append(row_text)
-                row_num = int(idx) + 2 if isinstance(idx, (int, float)) else 2
-                print(f"DEBUG: 処理済み行 {row_num}: {row_text[:100]}...")  # Excel行番号で表示
+        logger.debug("Using columns: %s", use_columns)
+
+        # CSV / Excel はいずれも dtype=str で読み込むため、全列が文字列ならコピーと変換を省く
+        df_selected = df if list(df.columns) == use_columns else df[use_columns]
+        if not all(is_string_dtype(column) for _, column in df_selected.items()):
+            df_selected = df_selected.astype(str)
+        # 列構成に特化して生成した関数で、各行をタプルのまま1回の呼び出しでテキスト化する
+        row_to_text = _compile_row_formatter(tuple(use_columns))
+        row_texts = [text for text in map(row_to_text, df_selected.itertuples(index=False, name=None)) if text]
         
         result_text = "\n".join(row_texts)
-        print(f"DEBUG: Generated text length: {len(result_text)} characters")
-        print(f"DEBUG: First 200 chars: {result_text[:200]}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Generated text length: %s characters", len(result_text))
+            logger.debug("First 200 chars: %s", result_text[:200])
         return result_text
     
     def _process_merged_cells_in_rag(self, df: pd.DataFrame) -> pd.DataFrame:
-        """RAGService用の結合セル処理"""
-        for idx in df.index:
-            row = df.loc[idx].copy()
-            
-            # H列からL列の結合セル対応（0ベースで7-11列）
-            h_col_idx = 7  # H列
-            l_col_idx = 11  # L列
-            
-            for i in range(1, len(row)):
-                if not str(row.iloc[i]).strip() or str(row.iloc[i]) == 'nan':
-                    if str(row.iloc[i-1]).strip() and str(row.iloc[i-1]) != 'nan':
-                        # H-L列の範囲内での結合セル処理
-                        if h_col_idx <= i-1 <= l_col_idx and h_col_idx <= i <= l_col_idx:
-                            row.iloc[i] = row.iloc[i-1]
-                            if idx < 5:  # 最初の5行のみログ出力
-                                print(f"DEBUG: RAG結合セル処理 - 行{idx+2}, 列{i}: '{row.iloc[i-1]}' を継承")
-            
-            df.loc[idx] = row
-        
+        """RAGService用の結合セル処理（ExcelIngestor と共通の fill_merged_cells を使う）"""
+        inherited = fill_merged_cells(df)
+        if inherited:
+            logger.debug("RAG結合セル処理 - %s セルを左隣から継承", inherited)
         return df
     
+    def _load_and_chunk_pdf(self, file_path: str) -> Iterator[Tuple[str, int]]:
+        """PDF を1ページずつ読み込み、ページごとに分割したチャンクを（チャンク, ページ番号）で順に返す"""
+        for page_index, page in enumerate(PyPDFLoader(file_path).lazy_load()):
+            # ページ番号は PyPDFLoader のメタデータ（0始まり）に合わせる
+            page_number = page.metadata.get("page", page_index)
+            for chunk in self.text_splitter.split_text(page.page_content):
+                yield chunk, page_number
+
+    def _load_and_split(self, file_path: str) -> Tuple[str, Optional[List[Tuple[str, Optional[int]]]]]:
+        """1ファイルを読み込んで（チャンク, ページ番号）に分割する（PDF 以外のページ番号は None、失敗時は None を返す）"""
+        try:
+            logger.debug("Processing file: %s", file_path)
+            if Path(file_path).suffix.lower() == '.pdf':
+                # PDF は全ページを連結せず、ページ単位で読み込みながら分割する
+                chunks = list(self._load_and_chunk_pdf(file_path))
+            else:
+                content = self._load_document(file_path)
+                logger.debug("Loaded content length: %s characters", len(content))
+                chunks = [(chunk, None) for chunk in self.text_splitter.split_text(content)]
+            logger.debug("Split into %s chunks", len(chunks))
+            return file_path, chunks
+        except Exception as e:
+            logger.exception("Error processing %s: %s", file_path, e)
+            return file_path, None
+
     def ingest_documents(self, file_paths: Optional[List[str]] = None) -> Dict[str, Any]:
         try:
             if file_paths is None:
@@ -179,119 +275,215 @@ class RAGService:
                 if not data_dir.exists():
                     return {"status": "error", "message": "Data directory not found"}
 
-                file_paths = []
-                for p in data_dir.iterdir():
-                    if p.is_file() and p.suffix.lower() in self.config.ALLOWED_EXTENSIONS:
-                        file_paths.append(str(p))
-                        print(f"DEBUG: Found file for ingestion: {p.name} (extension: {p.suffix.lower()})")
+                # scandir はエントリ種別をディレクトリ読み出し時に取得するため、ファイルごとの stat を省ける
+                allowed_extensions = self.config.ALLOWED_EXTENSIONS
+                with os.scandir(data_dir) as entries:
+                    file_paths = [
+                        entry.path for entry in entries
+                        if os.path.splitext(entry.name)[1].lower() in allowed_extensions and entry.is_file()
+                    ]
                 
-                print(f"DEBUG: Total files found for ingestion: {len(file_paths)}")
+                logger.debug("Total files found for ingestion: %s", len(file_paths))
             
             if not file_paths:
                 return {"status": "warning", "message": "No documents found to ingest"}
             
+            collection = self.vectorstore._collection
             total_chunks = 0
             processed_files = []
+            # 複数ファイルのチャンクを、全埋め込みスレッドに1バッチずつ行き渡る件数まで溜めてから埋め込み・登録する
+            batch_size = self.config.RAG_INGEST_BATCH_SIZE
+            flush_size = batch_size * self.config.RAG_INGEST_CONCURRENCY
+            batch_texts: List[str] = []
+            batch_metadatas: List[Dict[str, Any]] = []
+            # 最後のチャンクがバッファ内にあり、書き込み完了待ちのファイル
+            pending_files: List[str] = []
+            failed_files = set()
+
+            def flush_batch() -> None:
+                nonlocal total_chunks
+                if batch_texts:
+                    try:
+                        # 埋め込み呼び出しと Chroma への1回の登録（SQLite の1トランザクション）は batch_size 件までに抑える
+                        slices = [
+                            (batch_texts[start:start + batch_size], batch_metadatas[start:start + batch_size])
+                            for start in range(0, len(batch_texts), batch_size)
+                        ]
+                        # 埋め込みは並列に先行して計算し、登録は入力順に直列で行う
+                        embedded = embed_executor.map(self.embeddings.embed_documents, [texts for texts, _ in slices])
+                        for (texts, metadatas), embeddings in zip(slices, embedded):
+                            collection.add(
+                                ids=[str(uuid.uuid4()) for _ in texts],
+                                embeddings=embeddings,
+                                metadatas=metadatas,
+                                documents=texts,
+                            )
+                            total_chunks += len(texts)
+                    except Exception as e:
+                        failed = {meta["source"] for meta in batch_metadatas}
+                        logger.exception("Error adding %s chunks from %s: %s", len(batch_texts), sorted(failed), e)
+                        failed_files.update(failed)
+                processed_files.extend(fp for fp in pending_files if fp not in failed_files)
+                batch_texts.clear()
+                batch_metadatas.clear()
+                pending_files.clear()
             
-            for file_path in file_paths:
-                try:
-                    print(f"DEBUG: Processing file: {file_path}")
-                    content = self._load_document(file_path)
-                    print(f"DEBUG: Loaded content length: {len(content)} characters")
-                    
-                    chunks = self.text_splitter.split_text(content)
-                    print(f"DEBUG: Split into {len(chunks)} chunks")
-                    
-                    metadata = [{"source": file_path, "chunk_id": i} for i in range(len(chunks))]
-                    
-                    self.vectorstore.add_texts(
-                        texts=chunks,
-                        metadatas=metadata
-                    )
-                    
-                    total_chunks += len(chunks)
-                    processed_files.append(file_path)
-                    print(f"DEBUG: Successfully processed {file_path} with {len(chunks)} chunks")
-                    
-                except Exception as e:
-                    print(f"ERROR: Error processing {file_path}: {e}")
-                    import traceback
-                    traceback.print_exc()
-                    continue
+            # 読み込み・分割はファイルごとに独立なので並列化し、Chroma への登録だけを直列に行う
+            if self.config.RAG_INGEST_WORKERS > 0:
+                # PDF / Excel の解析は CPU 処理が中心のため、指定があれば別プロセスで行う
+                executor = ProcessPoolExecutor(
+                    max_workers=min(self.config.RAG_INGEST_WORKERS, len(file_paths)),
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+                load_and_split = _load_and_split_in_worker
+            else:
+                executor = ThreadPoolExecutor(max_workers=min(INGEST_LOAD_WORKERS, len(file_paths)))
+                load_and_split = self._load_and_split
+            with executor, ThreadPoolExecutor(max_workers=self.config.RAG_INGEST_CONCURRENCY) as embed_executor:
+                # map は入力順に結果を返すため、登録順とチャンク番号は逐次処理と変わらない
+                for file_path, chunks in executor.map(load_and_split, file_paths):
+                    if chunks is None:
+                        continue
+                    for i, (chunk, page) in enumerate(chunks):
+                        batch_texts.append(chunk)
+                        metadata: Dict[str, Any] = {"source": file_path, "chunk_id": i}
+                        # Chroma のメタデータは None を保持できないため、ページ番号は PDF のみ付与する
+                        if page is not None:
+                            metadata["page"] = page
+                        batch_metadatas.append(metadata)
+                        if len(batch_texts) >= flush_size:
+                            flush_batch()
+                    pending_files.append(file_path)
+                flush_batch()
+            self._collection_size = None
             
             return {"status": "success", "message": f"Processed {len(processed_files)} files, {total_chunks} chunks", "processed_files": processed_files, "total_chunks": total_chunks}
             
         except Exception as e:
             return {"status": "error", "message": str(e)}
 
+    def _retrieve(self, message: str) -> List[Document]:
+        candidate_k = max(self.config.RAG_CANDIDATE_K, self.config.RAG_TOP_K)
+        if self.reranker is not None:
+            # 候補を多めに取得し、再ランキングで上位 RAG_RERANK_TOP_N 件に絞る
+            candidates = self.enhanced_retriever.hybrid_search(message, top_k=candidate_k, final_k=candidate_k)
+            return self.reranker.rerank(message, candidates, self.config.RAG_RERANK_TOP_N)
+        if self.config.RAG_USE_MMR:
+            return self.enhanced_retriever.hybrid_search(message, top_k=self.config.RAG_TOP_K)
+        return self.enhanced_retriever.hybrid_search(message, top_k=candidate_k)
+
+    def _collection_count(self) -> int:
+        """コレクション件数を返す（1件以上あればキャッシュし、chat ごとの count() 呼び出しを省く）"""
+        if self._collection_size is not None:
+            return self._collection_size
+        count = int(self.vectorstore._collection.count() or 0)
+        # 0件はインジェスト（/ingest-excel など別経路を含む）ですぐ変わるためキャッシュしない
+        if count > 0:
+            self._collection_size = count
+        return count
+
+    @staticmethod
+    def _keyword_terms(query: str) -> List[str]:
+        """キーワード検索の検索語（クエリ全体＋区切り文字で分割した語）を返す"""
+        if not query:
+            return []
+        # クエリ全体と分割語が同じ場合に二重に数えないよう、順序を保って重複を除く
+        return list(dict.fromkeys([query, *(t for t in KEYWORD_SEPARATOR_PATTERN.split(query) if t)]))
+
+    @staticmethod
+    def _keyword_where_document(terms: List[str]) -> Dict[str, Any]:
+        """いずれかの検索語を含む文書に絞る where_document 条件（$or は2件以上が必要）"""
+        if len(terms) == 1:
+            return {"$contains": terms[0]}
+        return {"$or": [{"$contains": t} for t in terms]}
+
+    @staticmethod
+    def _keyword_scores(texts: List[Optional[str]], terms: List[str]) -> np.ndarray:
+        """各文書について、検索語ごとの（重ならない）出現回数の合計を返す"""
+        scores = np.zeros(len(texts), dtype=np.int64)
+        if not terms or not texts:
+            return scores
+        if ahocorasick is None:
+            docs_series = pd.Series(texts, dtype=object).fillna("")
+            # 大半の文書はどの語も含まないため、まず全語の選択パターンで1回だけ走査して候補を絞る
+            matched = docs_series.str.contains("|".join(map(re.escape, terms)), regex=True).to_numpy(dtype=bool)
+            if not matched.any():
+                return scores
+            candidates = docs_series[matched]
+            for t in terms:
+                scores[matched] += candidates.str.count(re.escape(t)).to_numpy(dtype=np.int64)
+            return scores
+
+        # 全検索語を1つのオートマトンにまとめ、文書ごとに1回の走査で数える
+        automaton = ahocorasick.Automaton()
+        for i, t in enumerate(terms):
+            automaton.add_word(t, (i, len(t)))
+        automaton.make_automaton()
+        for doc_index, text in enumerate(texts):
+            if not text:
+                continue
+            # str.count と同じく、同じ語の重なった出現は数えない
+            next_start = [0] * len(terms)
+            score = 0
+            for end, (i, length) in automaton.iter(text):
+                start = end - length + 1
+                if start >= next_start[i]:
+                    next_start[i] = end + 1
+                    score += 1
+            scores[doc_index] = score
+        return scores
+
     def chat(self, message: str) -> Dict[str, Any]:
         try:
-            candidate_k = max(self.config.RAG_CANDIDATE_K, self.config.RAG_TOP_K)
-            if getattr(self.config, "RAG_USE_MMR", True):
-                docs = self.enhanced_retriever.hybrid_search(message, top_k=self.config.RAG_TOP_K)
-            else:
-                docs = self.enhanced_retriever.hybrid_search(message, top_k=candidate_k)
+            docs = self._retrieve(message)
             
             try:
-                stats = self.vectorstore._collection.count()
-                if not stats or int(stats) == 0:
+                if self._collection_count() == 0:
                     ingest_result = self.ingest_documents()
-                    candidate_k = max(self.config.RAG_CANDIDATE_K, self.config.RAG_TOP_K)
-                    if getattr(self.config, "RAG_USE_MMR", True):
-                        docs = self.enhanced_retriever.hybrid_search(message, top_k=self.config.RAG_TOP_K)
-                    else:
-                        docs = self.enhanced_retriever.hybrid_search(message, top_k=candidate_k)
+                    docs = self._retrieve(message)
                     if not docs:
                         return {"status": "warning", "message": "インデックスが空です。左のアップロード→インデックス再作成を実行してください。", "answer": "該当する情報は見つかりませんでした", "sources": []}
             except Exception:
                 pass
 
             if not docs:
-                try:
-                    all_items = self.vectorstore._collection.get(include=["documents", "metadatas"], limit=100000)
-                    all_docs = (all_items.get("documents") or [])
-                    all_metas = (all_items.get("metadatas") or [])
-                except Exception:
-                    all_docs, all_metas = [], []
-
-                def _keyword_score(text: str, query: str) -> int:
-                    if not text or not query:
-                        return 0
-                    seps = ['\n', '\t', '、', '。', '，', ',', '．', '.', ' ', '　', ';', '：', ':']
-                    terms = [query]
-                    tmp = query
-                    for s in seps:
-                        tmp = tmp.replace(s, ' ')
-                    terms += [t for t in tmp.split(' ') if t]
-                    score = 0
-                    for t in terms:
-                        score += text.count(t)
-                    return score
-
-                scored = []
-                for txt, md in zip(all_docs, all_metas):
-                    s = _keyword_score(txt or "", message)
-                    if s > 0:
-                        scored.append((s, txt or "", md or {}))
-
-                if scored:
-                    scored.sort(key=lambda x: x[0], reverse=True)
-                    top = scored[: self.config.RAG_TOP_K]
-                    docs = [Document(page_content=txt, metadata=md) for _, txt, md in top]
+                # クエリと区切り文字で分けた語を検索語とし、文書ごとの出現回数の合計をスコアとする
+                terms = self._keyword_terms(message)
+                all_docs, all_metas = [], []
+                if terms:
+                    try:
+                        # いずれかの語を含む文書だけを Chroma の全文検索インデックス（FTS5 trigram）で絞り込んで取得する
+                        all_items = self.vectorstore._collection.get(
+                            where_document=self._keyword_where_document(terms),
+                            include=["documents", "metadatas"],
+                            limit=100000,
+                        )
+                        all_docs = (all_items.get("documents") or [])
+                        all_metas = (all_items.get("metadatas") or [])
+                    except Exception:
+                        all_docs, all_metas = [], []
+
+                scores = self._keyword_scores(all_docs, terms)
+
+                matched = np.flatnonzero(scores > 0)
+                if matched.size:
+                    # 同点は元の並び順を保つ（安定ソート）
+                    order = matched[np.argsort(-scores[matched], kind="stable")][: self.config.RAG_TOP_K]
+                    docs = [Document(page_content=all_docs[i] or "", metadata=all_metas[i] or {}) for i in order]
                 else:
                     return {"status": "warning", "message": "該当する情報は見つかりませんでした", "answer": "該当する情報は見つかりませんでした", "sources": []}
             
             processed_docs = self._process_search_results(docs, message)
 
-            budget = max(256, getattr(self.config, "RAG_MAX_CONTEXT_TOKENS", 4000))
+            budget = max(256, self.config.RAG_MAX_CONTEXT_TOKENS)
             selected = []
             used = 0
             for d in processed_docs:
-                t = self._simple_len(d.page_content)
+                t = count_tokens(d.page_content)
                 if used + t > budget:
                     remaining = budget - used
                     if remaining > 100:
-                        partial_content = d.page_content[:remaining] + "..."
+                        partial_content = truncate_tokens(d.page_content, remaining) + "..."
                         selected.append(Document(page_content=partial_content, metadata=d.metadata))
                     break
                 selected.append(d)
@@ -301,9 +493,8 @@ class RAGService:
                 selected = processed_docs[:1]
 
             context = self._build_structured_context(selected)
-            system_instructions = getattr(self.config, "RAG_SYSTEM_INSTRUCTIONS", "")
             user_prompt = self._build_enhanced_prompt(message, context)
-            prompt = f"{system_instructions}\n\n{user_prompt}"
+            prompt = self._prompt_prefix + user_prompt
 
             response = self.llm.invoke(prompt)
             answer = response.content
@@ -340,46 +531,57 @@ class RAGService:
 
     def prune_index_except(self, keep_filename_contains: str) -> Dict[str, Any]:
         try:
-            results = self.vectorstore._collection.get(include=["metadatas", "ids"], limit=100000)
-            metadatas = results.get("metadatas", []) or []
-            ids = results.get("ids", []) or []
-
-            delete_ids = []
-            for item_id, md in zip(ids, metadatas):
-                src = (md or {}).get("source", "")
-                base = os.path.basename(str(src))
-                if keep_filename_contains not in base:
-                    delete_ids.append(item_id)
-
-            if not delete_ids:
-                return {"status": "success", "message": "削除対象はありません", "deleted": 0}
+            collection = self.vectorstore._collection
+            deleted = 0
+            offset = 0
+            # 取得・削除ともに PRUNE_PAGE_SIZE 件ずつ行い、1回の呼び出しの件数を抑える
+            while True:
+                # ids は include の指定なしで常に返る
+                page = collection.get(include=["metadatas"], limit=PRUNE_PAGE_SIZE, offset=offset)
+                ids = page.get("ids") or []
+                if not ids:
+                    break
+                metadatas = page.get("metadatas") or [None] * len(ids)
+                delete_ids = [
+                    item_id for item_id, md in zip(ids, metadatas)
+                    if keep_filename_contains not in os.path.basename(str((md or {}).get("source", "")))
+                ]
+                if delete_ids:
+                    collection.delete(ids=delete_ids)
+                    deleted += len(delete_ids)
+                    self._collection_size = None
+                # 削除した分は後続が前に詰まるため、残した件数だけ読み進める
+                offset += len(ids) - len(delete_ids)
 
-            self.vectorstore._collection.delete(ids=delete_ids)
-            return {"status": "success", "message": f"{len(delete_ids)} 件を削除しました", "deleted": len(delete_ids)}
+            if not deleted:
+                return {"status": "success", "message": "削除対象はありません", "deleted": 0}
+            return {"status": "success", "message": f"{deleted} 件を削除しました", "deleted": deleted}
         except Exception as e:
             return {"status": "error", "message": str(e)}
 
     def _process_search_results(self, docs: List[Document], query: str) -> List[Document]:
         if not docs:
             return docs
-        unique_docs = []
-        seen_contents = set()
+        # 先頭100文字が同じ文書は重複とみなし、最初の1件だけを残す（順序は維持）
+        first_by_prefix: Dict[str, Document] = {}
         for doc in docs:
-            content_hash = hash(doc.page_content[:100])
-            if content_hash not in seen_contents:
-                seen_contents.add(content_hash)
-                unique_docs.append(doc)
+            first_by_prefix.setdefault(doc.page_content[:100], doc)
+        unique_docs = list(first_by_prefix.values())
+        # クエリの小文字化・分割は文書ごとではなく一度だけ行う
+        query_terms = query.lower().split()
+        if not query_terms or len(unique_docs) < 2:
+            # 全件同点（または1件以下）なら安定ソートでも順序は変わらないため、文書の小文字化ごと省く
+            return unique_docs
         def relevance_score(doc: Document) -> float:
             content = doc.page_content.lower()
-            query_lower = query.lower()
+            # 企業名の値部分は文書ごとに一度だけ切り出す
+            company_span = content.split("企業名:", 2)[1].split("|", 1)[0] if "企業名:" in content else ""
             score = 0.0
-            query_terms = query_lower.split()
             for term in query_terms:
-                if term in content:
-                    if "企業名:" in content and term in content.split("企業名:")[1].split("|")[0]:
-                        score += 3.0
-                    elif term in content:
-                        score += 1.0
+                if term in company_span:
+                    score += 3.0
+                elif term in content:
+                    score += 1.0
             return score
         unique_docs.sort(key=relevance_score, reverse=True)
         return unique_docs
@@ -387,35 +589,29 @@ class RAGService:
     def _build_structured_context(self, docs: List[Document]) -> str:
         if not docs:
             return ""
-        context_parts = []
-        context_parts.append("【企業データベース情報】")
+        context_parts = ["【企業データベース情報】"]
         for i, doc in enumerate(docs, 1):
             content = doc.page_content.strip()
             source = doc.metadata.get("source", "Unknown")
-            structured_info = self._structure_company_info(content)
-            context_parts.append(f"\n{i}. {structured_info}")
+            context_parts.append(f"\n{i}. " + " | ".join(self._iter_structured_company_info(content)))
             context_parts.append(f"   [情報源: {source}]")
         return "\n".join(context_parts)
 
-    def _structure_company_info(self, content: str) -> str:
-        lines = content.split("|")
+    def _iter_structured_company_info(self, content: str) -> Iterator[str]:
+        """「項目: 値」を優先項目→その他の順に返す（呼び出し側で1回だけ連結する）"""
         structured = {}
-        for line in lines:
-            if ":" in line:
-                key, value = line.split(":", 1)
-                key = key.strip()
+        for line in content.split("|"):
+            key, sep, value = line.partition(":")
+            if sep:
                 value = value.strip()
                 if value and value != "nan":
-                    structured[key] = value
-        priority_fields = ["企業名", "代表電話", "直通番号", "従業員数", "リードステータス", "架電者", "架電ログ", "社内メモ"]
-        result_parts = []
-        for field in priority_fields:
+                    structured[key.strip()] = value
+        for field in PRIORITY_COMPANY_FIELDS:
             if field in structured:
-                result_parts.append(f"{field}: {structured[field]}")
+                yield f"{field}: {structured[field]}"
         for key, value in structured.items():
-            if key not in priority_fields:
-                result_parts.append(f"{key}: {value}")
-        return " | ".join(result_parts)
+            if key not in PRIORITY_COMPANY_FIELD_SET:
+                yield f"{key}: {value}"
 
     def _build_enhanced_prompt(self, query: str, context: str) -> str:
         return f"""【営業支援クエリ】
@@ -0,0 +1,80 @@
+"""
+クロスエンコーダによる再ランキングモジュール。
+ハイブリッド検索で多めに取得した候補（RAG_CANDIDATE_K）を再スコアリングし、
+LLM に渡す件数を RAG_RERANK_TOP_N に絞り込む。RAG_USE_RERANKER=true で有効化。
+optimum[onnxruntime] / transformers は任意依存のため、使用時にのみ読み込む。
+"""
+
+import logging
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+from langchain.schema import Document
+
+from config import CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+class CrossEncoderReranker:
+    """ONNX Runtime（int8 動的量子化）で推論するクロスエンコーダ再ランキングクラス"""
+
+    def __init__(self, model_name: str = CONFIG.RAG_RERANKER_MODEL, batch_size: int = 16):
+        try:
+            from optimum.onnxruntime import ORTModelForSequenceClassification, ORTQuantizer
+            from optimum.onnxruntime.configuration import AutoQuantizationConfig
+            from transformers import AutoTokenizer
+        except ImportError as e:
+            raise ValueError(f"optimum[onnxruntime] or transformers not available: {e}")
+
+        self.model_name = model_name
+        self.batch_size = batch_size
+
+        # 量子化済みモデルは CHROMA_STORE_DIR 配下に保存し、次回以降は再変換しない
+        model_dir = Path(CONFIG.CHROMA_STORE_DIR) / "onnx_models" / model_name.replace("/", "__")
+        quantized_file = "model_quantized.onnx"
+        if not (model_dir / quantized_file).exists():
+            logger.info("再ランキングモデルを量子化します: %s", model_name)
+            model = ORTModelForSequenceClassification.from_pretrained(model_name, export=True)
+            quantizer = ORTQuantizer.from_pretrained(model)
+            quantizer.quantize(
+                save_dir=str(model_dir),
+                quantization_config=AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False),
+            )
+            AutoTokenizer.from_pretrained(model_name).save_pretrained(str(model_dir))
+
+        self.tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+        self.model = ORTModelForSequenceClassification.from_pretrained(str(model_dir), file_name=quantized_file)
+        logger.info("Using reranker: %s", model_name)
+
+    def _score(self, query: str, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer([query] * len(texts), texts, padding=True, truncation=True, max_length=512, return_tensors="np")
+        logits = np.asarray(self.model(**encoded).logits, dtype=np.float32).reshape(len(texts), -1)[:, 0]
+        return 1.0 / (1.0 + np.exp(-logits))
+
+    def rerank(self, query: str, docs: List[Document], top_n: int) -> List[Document]:
+        """候補ドキュメントをクエリとの関連度順に並べ替え、上位 top_n 件を返す"""
+        if not docs:
+            return docs
+        texts = [d.page_content for d in docs]
+        scores = np.concatenate([
+            self._score(query, texts[i:i + self.batch_size])
+            for i in range(0, len(texts), self.batch_size)
+        ])
+        order = np.argsort(-scores, kind="stable")[:top_n]
+        reranked = []
+        for idx in order:
+            doc = docs[int(idx)]
+            doc.metadata["rerank_score"] = float(scores[idx])
+            reranked.append(doc)
+        return reranked
+
+
+@lru_cache(maxsize=None)
+def get_reranker() -> Optional[CrossEncoderReranker]:
+    """RAG_USE_RERANKER が有効な場合のみ、プロセス内で共有する再ランキングインスタンスを返す"""
+    if not CONFIG.RAG_USE_RERANKER:
+        return None
+    return CrossEncoderReranker()
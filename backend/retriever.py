@@ -7,22 +7,47 @@ from typing import List, Dict, Any, Optional, Tuple
 import re
 from collections import Counter
 import math
+import numpy as np
 from langchain.schema import Document
 from langchain_community.vectorstores import Chroma
 from pydantic.v1 import SecretStr
-from pathlib import Path
 import chromadb
 
-from config import Config
-from gemini import GeminiEmbeddings
+from config import CONFIG, LEADS_COLLECTION_METADATA
+from gemini import get_embeddings
 from utils.name_normalize import to_katakana
 
 
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """float32 の連続配列に揃え、各行を L2 正規化する（ゼロベクトルはそのまま）"""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def _mmr_select(query_vec: np.ndarray, candidates: np.ndarray, k: int, lambda_mult: float) -> List[int]:
+    """正規化済みベクトル同士の内積（=コサイン類似度）で MMR 選択を行い、候補のインデックスを返す"""
+    k = min(k, len(candidates))
+    if k <= 0:
+        return []
+    query_sims = candidates @ query_vec
+    selected = [int(np.argmax(query_sims))]
+    # 選択済み集合との最大類似度を差分更新し、候補×選択済みの再計算を避ける
+    max_selected_sims = candidates @ candidates[selected[0]]
+    while len(selected) < k:
+        scores = lambda_mult * query_sims - (1 - lambda_mult) * max_selected_sims
+        scores[selected] = -np.inf
+        idx = int(np.argmax(scores))
+        selected.append(idx)
+        np.maximum(max_selected_sims, candidates @ candidates[idx], out=max_selected_sims)
+    return selected
+
+
 class EnhancedRetriever:
     """企業データベース用の高度な検索機能を提供するクラス"""
     
     def __init__(self):
-        self.config = Config()
+        self.config = CONFIG
         
         self.top_k = 5
         self.final_k = 3
@@ -30,13 +55,14 @@ class EnhancedRetriever:
         self.mmr_lambda = 0.5
         self.similarity_metric = "cosine"
         
-        self.embeddings = GeminiEmbeddings()
+        self.embeddings = get_embeddings()
         
-        persist_dir = str(Path(self.config.CHROMA_STORE_DIR).resolve())
+        persist_dir = self.config.CHROMA_STORE_DIR
         self.vectorstore = Chroma(
             collection_name="leads",
             persist_directory=persist_dir,
-            embedding_function=self.embeddings
+            embedding_function=self.embeddings,
+            collection_metadata=LEADS_COLLECTION_METADATA,
         )
     
     def hybrid_search(
@@ -45,10 +71,12 @@ class EnhancedRetriever:
         company_filter: Optional[str] = None,
         row_id_filter: Optional[int] = None,
         top_k: Optional[int] = None,
-        score_threshold: Optional[float] = None
+        score_threshold: Optional[float] = None,
+        final_k: Optional[int] = None
     ) -> List[Document]:
         top_k = top_k or self.top_k
         score_threshold = score_threshold or self.score_threshold
+        final_k = final_k or self.final_k
         
         try:
             if not company_filter:
@@ -63,7 +91,7 @@ class EnhancedRetriever:
             # row_grouped_docs = self._group_by_row_and_reconstruct(combined_docs, query)
             
             # 代わりに元の検索結果をそのまま使用
-            final_docs = combined_docs[:self.final_k]
+            final_docs = combined_docs[:final_k]
             
             # 検索デバッグ情報を出力
             self._print_search_debug_info(query, company_filter, final_docs)
@@ -146,13 +174,26 @@ class EnhancedRetriever:
                 # 会社名の順序・表記ゆれで検索結果を落とさないため、ベクター側の厳密フィルタは外す
                 # （BM25側の事前フィルタと最終リランキングで十分に絞り込む）
                 where_filter = None
-            docs = self.vectorstore.max_marginal_relevance_search(
-                query,
-                k=top_k,
-                fetch_k=max(20, top_k * 2),
-                lambda_mult=self.mmr_lambda,
-                filter=where_filter
+            # クエリ・候補ベクトルは一度だけ float32 に変換・正規化して MMR に使う
+            query_embedding = self.embeddings.embed_query_array(query)
+            results = self.vectorstore._collection.query(
+                query_embeddings=[query_embedding.tolist()],
+                n_results=max(20, top_k * 2),
+                where=where_filter,
+                include=["metadatas", "documents", "embeddings"],
             )
+            documents = results["documents"][0]
+            if not documents:
+                print("INFO: ベクトル検索結果: 0件")
+                return []
+            metadatas = results["metadatas"][0]
+            candidates = _normalize_rows(results["embeddings"][0])
+            selected = _mmr_select(_normalize_rows(query_embedding), candidates, top_k, self.mmr_lambda)
+            # LangChain の MMR 検索と同じく、候補の距離順を保ったまま返す
+            docs = [
+                Document(page_content=documents[i], metadata=metadatas[i] or {})
+                for i in sorted(selected)
+            ]
             print(f"INFO: ベクトル検索結果: {len(docs)}件")
             return docs
         except Exception as e:
@@ -636,7 +677,12 @@ class EnhancedRetriever:
                     "final_k": self.final_k, 
                     "score_threshold": self.score_threshold, 
                     "mmr_lambda": self.mmr_lambda
-                }
+                },
+                # 実際に永続化されている HNSW インデックス設定（作成時のメタデータ）
+                "index_parameters": {
+                    key: value for key, value in (collection.metadata or {}).items()
+                    if key.startswith("hnsw:")
+                },
             }
         except Exception as e:
             return {"error": str(e)}
\ No newline at end of file
@@ -0,0 +1,64 @@
+"""
+非同期処理ユーティリティ
+同期 API から asyncio のコルーチンを実行するための共通処理
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Coroutine, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+def run_sync(coro: Coroutine[Any, Any, T]) -> T:
+    """
+    コルーチンを同期的に実行して結果を返す
+
+    FastAPI のハンドラなどイベントループ上から呼ばれた場合は、別スレッドの新しいループで実行する
+
+    Args:
+        coro: 実行するコルーチン
+
+    Returns:
+        コルーチンの戻り値
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
+
+
+class SingleFlight:
+    """
+    同じキーの処理が実行中であれば、新たに実行せずその結果を共有する（同時リクエストの合流）
+
+    完了した結果は保持しないため、キャッシュではなく「実行中の重複呼び出し」だけをまとめる
+    """
+
+    def __init__(self) -> None:
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    async def run(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        future = self._inflight.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # 待機者がいない場合に "exception was never retrieved" を出さない
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._inflight[key]
@@ -0,0 +1,64 @@
+"""
+Chroma メタデータの JSON 変換ユーティリティ
+chromadb はメタデータを埋め込みキューへ書き込む際に標準 json でシリアライズするため、orjson に差し替える
+"""
+
+import json
+import logging
+import math
+import types
+from typing import Any
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+# 差し替えを確認済みの chromadb バージョン（埋め込みキュー内部の json 呼び出しに依存するため、他のバージョンでは差し替えない）
+SUPPORTED_CHROMADB_VERSIONS = frozenset({"0.4.18"})
+
+
+def _has_non_finite(obj: Any) -> bool:
+    """NaN / Infinity を含むか（orjson はこれらを null に変換してしまう）"""
+    if isinstance(obj, float):
+        return not math.isfinite(obj)
+    if isinstance(obj, dict):
+        return any(_has_non_finite(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return any(_has_non_finite(v) for v in obj)
+    return False
+
+
+def _dumps(obj: Any, **kwargs: Any) -> str:
+    if _has_non_finite(obj):
+        # 標準 json と同じく NaN / Infinity のまま書き込む
+        return json.dumps(obj, **kwargs)
+    try:
+        return orjson.dumps(obj).decode("utf-8")
+    except TypeError:
+        # orjson が扱えない型（数値キーなど）は標準 json に任せる
+        return json.dumps(obj, **kwargs)
+
+
+def _loads(s: Any, **kwargs: Any) -> Any:
+    try:
+        return orjson.loads(s)
+    except orjson.JSONDecodeError:
+        # NaN など標準 json のみが読める値
+        return json.loads(s, **kwargs)
+
+
+def install_orjson_metadata_codec() -> None:
+    """chromadb の埋め込みキューが使う json モジュールを orjson 版に置き換える（冪等）"""
+    try:
+        import chromadb
+        from chromadb.db.mixins import embeddings_queue
+    except ImportError:
+        logger.warning("chromadb の埋め込みキューが見つからないため orjson への切り替えをスキップします")
+        return
+    version = getattr(chromadb, "__version__", "")
+    if version not in SUPPORTED_CHROMADB_VERSIONS:
+        logger.warning("chromadb %s は未確認のバージョンのため orjson への切り替えをスキップします", version)
+        return
+    if not isinstance(getattr(embeddings_queue, "json", None), types.ModuleType):
+        return
+    embeddings_queue.json = types.SimpleNamespace(dumps=_dumps, loads=_loads)  # type: ignore[attr-defined]
@@ -5,7 +5,8 @@
 
 import unicodedata
 import re
-from typing import List, Set
+from functools import lru_cache
+from typing import List, Set, Tuple
 
 # 法人格トークン（前後で検出・除去）
 CORP_TOKENS = [
@@ -15,6 +16,29 @@ CORP_TOKENS = [
     "特定非営利活動法人", "NPO法人", "学校法人", "社会福祉法人"
 ]
 
+# 企業名抽出用パターン（事前コンパイル）
+# 法人格付きパターン
+FORMAL_COMPANY_PATTERNS = tuple(re.compile(p) for p in (
+    r'([^\s]+株式会社)',
+    r'([^\s]+有限会社)',
+    r'([^\s]+合同会社)',
+    r'([^\s]+合資会社)',
+    r'([^\s]+合名会社)',
+    r'(株式会社[^\s]+)',
+    r'(有限会社[^\s]+)',
+    r'(合同会社[^\s]+)',
+    r'(\(株\)[^\s]+)',
+    r'([^\s]+\(株\))',
+))
+# 一般的な企業名パターン
+GENERAL_COMPANY_PATTERNS = tuple(re.compile(p) for p in (
+    r'([ア-ヶ]{3,})',      # カタカナ3文字以上
+    r'([一-龯]{2,})',      # 漢字2文字以上
+    r'([A-Za-z]{3,})',     # アルファベット3文字以上
+    r'([ア-ヶ一-龯]{3,})', # カタカナ・漢字混合3文字以上
+))
+
+
 def to_katakana(s: str) -> str:
     """
     ひらがなをカタカナに変換し、全角半角・記号ゆらぎを吸収
@@ -75,6 +99,7 @@ def strip_corp(s: str) -> str:
     
     return result
 
+@lru_cache(maxsize=4096)
 def normalize_name(name: str) -> str:
     """
     企業名を正規化（基本正規化）
@@ -96,23 +121,15 @@ def normalize_name(name: str) -> str:
     
     return normalized
 
-def build_name_variants(name: str) -> List[str]:
-    """
-    企業名のバリアントを生成（検索用）
-    
-    Args:
-        name: 元の企業名
-        
-    Returns:
-        企業名バリアントのリスト（重複なし）
-    """
+@lru_cache(maxsize=4096)
+def _build_name_variants(name: str) -> Tuple[str, ...]:
     if not name:
-        return []
+        return ()
     
     # 基本正規化
     k = normalize_name(name)
     if not k:
-        return []
+        return ()
     
     # 法人格を除去したコア名
     core = strip_corp(k)
@@ -144,13 +161,20 @@ def build_name_variants(name: str) -> List[str]:
         variants_set.add(f"有限会社{core}")
         variants_set.add(f"(有){core}")
     
-    # 重複を除去してリストに変換
-    variants_list = list(variants_set)
-    
-    # 空文字列を除去
-    variants_list = [v for v in variants_list if v.strip()]
+    # 空文字列を除去（キャッシュを共有するため不変のタプルで返す）
+    return tuple(v for v in variants_set if v.strip())
+
+def build_name_variants(name: str) -> List[str]:
+    """
+    企業名のバリアントを生成（検索用）
     
-    return variants_list
+    Args:
+        name: 元の企業名
+        
+    Returns:
+        企業名バリアントのリスト（重複なし）
+    """
+    return list(_build_name_variants(name))
 
 def fuzzy_normalize_for_search(query: str) -> str:
     """
@@ -194,34 +218,14 @@ def extract_core_company_name(text: str) -> str:
     normalized = fuzzy_normalize_for_search(text)
     
     # 法人格付きパターンの検出
-    formal_patterns = [
-        r'([^\s]+株式会社)',
-        r'([^\s]+有限会社)',
-        r'([^\s]+合同会社)',
-        r'([^\s]+合資会社)',
-        r'([^\s]+合名会社)',
-        r'(株式会社[^\s]+)',
-        r'(有限会社[^\s]+)',
-        r'(合同会社[^\s]+)',
-        r'(\(株\)[^\s]+)',
-        r'([^\s]+\(株\))',
-    ]
-    
-    for pattern in formal_patterns:
-        match = re.search(pattern, normalized)
+    for pattern in FORMAL_COMPANY_PATTERNS:
+        match = pattern.search(normalized)
         if match:
             return match.group(1)
     
     # 一般的な企業名パターン（3文字以上のカタカナ・漢字）
-    general_patterns = [
-        r'([ア-ヶ]{3,})',      # カタカナ3文字以上
-        r'([一-龯]{2,})',      # 漢字2文字以上
-        r'([A-Za-z]{3,})',     # アルファベット3文字以上
-        r'([ア-ヶ一-龯]{3,})', # カタカナ・漢字混合3文字以上
-    ]
-    
-    for pattern in general_patterns:
-        match = re.search(pattern, normalized)
+    for pattern in GENERAL_COMPANY_PATTERNS:
+        match = pattern.search(normalized)
         if match:
             candidate = match.group(1)
             # 一般的すぎる単語は除外
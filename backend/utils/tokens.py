@@ -0,0 +1,68 @@
+"""
+トークン数計算ユーティリティ
+RAG_MAX_CONTEXT_TOKENS によるコンテキスト予算の計算に使用する（tiktoken の Rust 実装 BPE）
+"""
+
+import logging
+from functools import lru_cache
+from typing import Any, Optional
+
+ENCODING_NAME = "cl100k_base"
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def get_encoding() -> Optional[Any]:
+    """tiktoken のエンコーダをプロセス内で一度だけ生成（未インストール・BPE ファイル取得失敗時は None）"""
+    try:
+        import tiktoken
+    except ImportError:
+        logger.warning("tiktoken が利用できないため文字数でトークン数を近似します")
+        return None
+    try:
+        return tiktoken.get_encoding(ENCODING_NAME)
+    except Exception as e:
+        # 初回は BPE ファイルをダウンロードするため、ネットワーク障害でチャットを失敗させない
+        logger.warning("tiktoken のエンコーダを読み込めないため文字数でトークン数を近似します: %s", e)
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """
+    テキストのトークン数を返す
+
+    Args:
+        text: 対象テキスト
+
+    Returns:
+        トークン数（tiktoken が無い場合は文字数）
+    """
+    if not text:
+        return 0
+    encoding = get_encoding()
+    if encoding is None:
+        return len(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """
+    テキストを先頭から max_tokens トークン以内に切り詰める
+
+    Args:
+        text: 対象テキスト
+        max_tokens: 最大トークン数
+
+    Returns:
+        切り詰めたテキスト
+    """
+    if max_tokens <= 0 or not text:
+        return ""
+    encoding = get_encoding()
+    if encoding is None:
+        return text[:max_tokens]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
@@ -9,7 +9,7 @@ sys.path.insert(0, backend_path)
 
 try:
     # 必要なモジュールをインポート
-    from config import Config
+    from config import CONFIG
     from gemini import GeminiEmbeddings
     from langchain_community.vectorstores import Chroma
     from langchain.schema import Document
@@ -22,7 +22,7 @@ try:
         
         try:
             # ChromaDBクライアントを直接作成
-            config = Config()
+            config = CONFIG
             chroma_client = chromadb.PersistentClient(path=str(config.CHROMA_PERSIST_DIR))
             collection = chroma_client.get_collection("leads")
             
@@ -0,0 +1,116 @@
+import pytest
+import sys
+import os
+import asyncio
+from pathlib import Path
+
+# バックエンドディレクトリをパスに追加
+sys.path.append(str(Path(__file__).parent.parent / "backend"))
+
+from utils.async_utils import SingleFlight, run_sync
+
+class TestSingleFlight:
+    def setup_method(self):
+        """テスト前のセットアップ"""
+        self.calls = []
+
+    def _make_func(self, key, release, result=None, error=None):
+        async def func():
+            self.calls.append(key)
+            await release.wait()
+            if error is not None:
+                raise error
+            return result
+        return func
+
+    def test_concurrent_calls_are_coalesced(self):
+        """同じキーの同時呼び出しが1回の実行にまとまり、全員に同じ結果が返ることのテスト"""
+        async def scenario():
+            flight = SingleFlight()
+            release = asyncio.Event()
+            tasks = [asyncio.create_task(flight.run("prompt", self._make_func("prompt", release, result="answer"))) for _ in range(3)]
+            await asyncio.sleep(0)
+            release.set()
+            return await asyncio.gather(*tasks)
+
+        assert asyncio.run(scenario()) == ["answer"] * 3
+        assert self.calls == ["prompt"]
+
+    def test_failure_is_propagated_to_all_waiters(self):
+        """実行中の失敗が合流した全ての呼び出しに伝わることのテスト"""
+        async def scenario():
+            flight = SingleFlight()
+            release = asyncio.Event()
+            tasks = [asyncio.create_task(flight.run("prompt", self._make_func("prompt", release, error=ValueError("LLM error")))) for _ in range(3)]
+            await asyncio.sleep(0)
+            release.set()
+            return await asyncio.gather(*tasks, return_exceptions=True)
+
+        results = asyncio.run(scenario())
+        assert self.calls == ["prompt"]
+        assert all(isinstance(r, ValueError) and str(r) == "LLM error" for r in results)
+
+    def test_key_is_released_after_failure(self):
+        """失敗した結果は保持されず、次の呼び出しで再実行されることのテスト"""
+        async def scenario():
+            flight = SingleFlight()
+            release = asyncio.Event()
+            release.set()
+            with pytest.raises(ValueError):
+                await flight.run("prompt", self._make_func("prompt", release, error=ValueError("LLM error")))
+            return await flight.run("prompt", self._make_func("prompt", release, result="answer"))
+
+        assert asyncio.run(scenario()) == "answer"
+        assert self.calls == ["prompt", "prompt"]
+
+    def test_different_keys_run_separately(self):
+        """異なるキーはまとめずに個別に実行されることのテスト"""
+        async def scenario():
+            flight = SingleFlight()
+            release = asyncio.Event()
+            tasks = [
+                asyncio.create_task(flight.run(key, self._make_func(key, release, result=key)))
+                for key in ("a", "b")
+            ]
+            await asyncio.sleep(0)
+            release.set()
+            return await asyncio.gather(*tasks)
+
+        assert asyncio.run(scenario()) == ["a", "b"]
+        assert sorted(self.calls) == ["a", "b"]
+
+    def test_cancelled_leader_cancels_waiters(self):
+        """先頭の呼び出しがキャンセルされた場合、合流した呼び出しもキャンセルされることのテスト"""
+        async def scenario():
+            flight = SingleFlight()
+            release = asyncio.Event()
+            leader = asyncio.create_task(flight.run("prompt", self._make_func("prompt", release, result="answer")))
+            await asyncio.sleep(0)
+            waiter = asyncio.create_task(flight.run("prompt", self._make_func("prompt", release, result="answer")))
+            await asyncio.sleep(0)
+            leader.cancel()
+            return await asyncio.gather(leader, waiter, return_exceptions=True)
+
+        results = asyncio.run(scenario())
+        assert all(isinstance(r, asyncio.CancelledError) for r in results)
+        assert self.calls == ["prompt"]
+
+class TestRunSync:
+    def test_run_sync_without_loop(self):
+        """イベントループ外から実行できることのテスト"""
+        async def coro():
+            return "ok"
+        assert run_sync(coro()) == "ok"
+
+    def test_run_sync_inside_loop(self):
+        """イベントループ上から呼ばれても別スレッドのループで実行できることのテスト"""
+        async def coro():
+            return "ok"
+
+        async def caller():
+            return run_sync(coro())
+
+        assert asyncio.run(caller()) == "ok"
+
+if __name__ == "__main__":
+    pytest.main([__file__])
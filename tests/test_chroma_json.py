@@ -0,0 +1,69 @@
+import json
+import math
+import pytest
+import sys
+import types
+from pathlib import Path
+
+# バックエンドディレクトリをパスに追加
+sys.path.append(str(Path(__file__).parent.parent / "backend"))
+
+from utils import chroma_json
+
+class TestChromaJson:
+    def setup_method(self):
+        """テスト前のセットアップ"""
+        self.metadata = {"company": "株式会社テスト", "excel_row": 12, "score": 0.5, "flag": True}
+
+    def _install_fake_chromadb(self, monkeypatch, version):
+        """指定バージョンの chromadb を模したモジュールを登録し、埋め込みキューを返す"""
+        embeddings_queue = types.ModuleType("chromadb.db.mixins.embeddings_queue")
+        embeddings_queue.json = json
+        modules = {
+            "chromadb": types.ModuleType("chromadb"),
+            "chromadb.db": types.ModuleType("chromadb.db"),
+            "chromadb.db.mixins": types.ModuleType("chromadb.db.mixins"),
+            "chromadb.db.mixins.embeddings_queue": embeddings_queue,
+        }
+        modules["chromadb"].__version__ = version
+        modules["chromadb.db.mixins"].embeddings_queue = embeddings_queue
+        for name, module in modules.items():
+            monkeypatch.setitem(sys.modules, name, module)
+        return embeddings_queue
+
+    def test_round_trip(self):
+        """メタデータが orjson 経由でも同じ値に戻ることのテスト"""
+        dumped = chroma_json._dumps(self.metadata)
+        assert isinstance(dumped, str)
+        assert chroma_json._loads(dumped) == self.metadata
+        assert json.loads(dumped) == self.metadata
+
+    def test_round_trip_non_finite(self):
+        """NaN / Infinity が null にならず標準 json と同じ表現で保存されることのテスト"""
+        metadata = {**self.metadata, "nan": float("nan"), "inf": float("inf"), "nested": [float("-inf")]}
+        dumped = chroma_json._dumps(metadata)
+        assert dumped == json.dumps(metadata)
+        loaded = chroma_json._loads(dumped)
+        assert math.isnan(loaded["nan"])
+        assert loaded["inf"] == float("inf")
+        assert loaded["nested"] == [float("-inf")]
+
+    def test_install_supported_version(self, monkeypatch):
+        """確認済みバージョンでは埋め込みキューの json が差し替わることのテスト"""
+        embeddings_queue = self._install_fake_chromadb(monkeypatch, "0.4.18")
+        chroma_json.install_orjson_metadata_codec()
+        assert embeddings_queue.json is not json
+        assert embeddings_queue.json.loads(embeddings_queue.json.dumps(self.metadata)) == self.metadata
+        # 2回目の呼び出しでは何もしない
+        patched = embeddings_queue.json
+        chroma_json.install_orjson_metadata_codec()
+        assert embeddings_queue.json is patched
+
+    def test_install_unsupported_version(self, monkeypatch):
+        """未確認バージョンでは差し替えないことのテスト"""
+        embeddings_queue = self._install_fake_chromadb(monkeypatch, "0.5.0")
+        chroma_json.install_orjson_metadata_codec()
+        assert embeddings_queue.json is json
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,156 @@
+import pytest
+import sys
+import os
+import threading
+from pathlib import Path
+
+import httpx
+import orjson
+
+# バックエンドディレクトリをパスに追加
+sys.path.append(str(Path(__file__).parent.parent / "backend"))
+
+import gemini
+from gemini import GeminiEmbeddingError, _QueryEmbedBatcher
+
+class TestQueryEmbedBatcher:
+    def setup_method(self):
+        """テスト前のセットアップ（API 呼び出しは記録するだけの関数に置き換える）"""
+        self.batch_calls = []
+        self.single_calls = []
+
+    def _fake_batch(self, texts):
+        self.batch_calls.append(list(texts))
+        return [[float(len(t)), float(i)] for i, t in enumerate(texts)]
+
+    def _fake_single(self, text):
+        self.single_calls.append(text)
+        return [float(len(text)), -1.0]
+
+    def _embed_concurrently(self, batcher, texts):
+        """texts を別々のスレッドから同時に埋め込み、入力順の結果（または例外）を返す"""
+        results = [None] * len(texts)
+        barrier = threading.Barrier(len(texts))
+
+        def worker(i):
+            barrier.wait()
+            try:
+                results[i] = batcher.embed(texts[i])
+            except Exception as e:
+                results[i] = e
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(texts))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(timeout=10)
+        return results
+
+    def test_concurrent_queries_share_one_batch(self, monkeypatch):
+        """同時に届いたクエリが1回のバッチにまとまり、各スレッドに自分の結果が返ることのテスト"""
+        monkeypatch.setattr(gemini, "embed_contents_batch", self._fake_batch)
+        monkeypatch.setattr(gemini, "embed_content", self._fake_single)
+        texts = ["a", "bb", "ccc", "dddd"]
+        batcher = _QueryEmbedBatcher(max_wait=5.0, max_size=len(texts))
+
+        results = self._embed_concurrently(batcher, texts)
+
+        assert len(self.batch_calls) == 1
+        assert sorted(self.batch_calls[0]) == sorted(texts)
+        assert self.single_calls == []
+        sent = self.batch_calls[0]
+        for text, result in zip(texts, results):
+            assert result == [float(len(text)), float(sent.index(text))]
+
+    def test_duplicate_queries_are_sent_once(self, monkeypatch):
+        """同じクエリが重なった場合は1件として送信され、全員に同じ結果が返ることのテスト"""
+        monkeypatch.setattr(gemini, "embed_contents_batch", self._fake_batch)
+        monkeypatch.setattr(gemini, "embed_content", self._fake_single)
+        batcher = _QueryEmbedBatcher(max_wait=5.0, max_size=3)
+
+        results = self._embed_concurrently(batcher, ["same", "same", "same"])
+
+        assert self.single_calls == ["same"]
+        assert self.batch_calls == []
+        assert results == [[4.0, -1.0]] * 3
+
+    def test_single_query(self, monkeypatch):
+        """1件だけの場合は待ち時間の後に embedContent で処理されることのテスト"""
+        monkeypatch.setattr(gemini, "embed_contents_batch", self._fake_batch)
+        monkeypatch.setattr(gemini, "embed_content", self._fake_single)
+        batcher = _QueryEmbedBatcher(max_wait=0.01, max_size=32)
+
+        assert batcher.embed("テスト") == [3.0, -1.0]
+        assert self.single_calls == ["テスト"]
+
+    def test_error_is_propagated_to_all_waiters(self, monkeypatch):
+        """バッチ送信の失敗がまとめられた全スレッドに伝わることのテスト"""
+        def failing_batch(texts):
+            raise GeminiEmbeddingError("Gemini batch embed error: 429")
+
+        monkeypatch.setattr(gemini, "embed_contents_batch", failing_batch)
+        monkeypatch.setattr(gemini, "embed_content", self._fake_single)
+        texts = ["a", "bb", "ccc"]
+        batcher = _QueryEmbedBatcher(max_wait=5.0, max_size=len(texts))
+
+        results = self._embed_concurrently(batcher, texts)
+
+        assert all(isinstance(r, GeminiEmbeddingError) for r in results)
+
+    def test_batcher_is_reusable_after_error(self, monkeypatch):
+        """失敗後の次のクエリは新しいバッチとして処理されることのテスト"""
+        def failing_single(text):
+            raise GeminiEmbeddingError("Gemini embed error: 500")
+
+        monkeypatch.setattr(gemini, "embed_content", failing_single)
+        batcher = _QueryEmbedBatcher(max_wait=0.01, max_size=32)
+        with pytest.raises(GeminiEmbeddingError):
+            batcher.embed("a")
+
+        monkeypatch.setattr(gemini, "embed_content", self._fake_single)
+        assert batcher.embed("a") == [1.0, -1.0]
+
+class TestEmbedRetry:
+    def setup_method(self):
+        """テスト前のセットアップ（429 を指定回数返してから成功するモックサーバー）"""
+        self.requests = []
+        self.rate_limited = 0
+
+    def _handler(self, request):
+        self.requests.append(request)
+        if len(self.requests) <= self.rate_limited:
+            return httpx.Response(429, text="RESOURCE_EXHAUSTED")
+        body = orjson.loads(request.content)
+        if "requests" in body:
+            return httpx.Response(200, json={"embeddings": [{"values": [1.0, 2.0]} for _ in body["requests"]]})
+        return httpx.Response(200, json={"embedding": {"values": [3.0, 4.0]}})
+
+    def _use_mock_client(self, monkeypatch):
+        monkeypatch.setattr(gemini, "_CLIENT", httpx.Client(transport=httpx.MockTransport(self._handler)))
+        monkeypatch.setattr(gemini, "_get_headers", lambda: {"Content-Type": "application/json"})
+        monkeypatch.setattr(gemini, "_retry_delay", lambda attempt: 0)
+
+    def test_single_batch_retries_rate_limit(self, monkeypatch):
+        """1バッチに収まる件数でも 429 を再試行することのテスト"""
+        self._use_mock_client(monkeypatch)
+        self.rate_limited = gemini.GEMINI_MAX_RETRIES - 1
+        assert gemini.embed_contents_batch(["a", "b"]) == [[1.0, 2.0], [1.0, 2.0]]
+        assert len(self.requests) == gemini.GEMINI_MAX_RETRIES
+
+    def test_single_batch_gives_up_after_max_retries(self, monkeypatch):
+        """429 が続く場合は GEMINI_MAX_RETRIES 回で諦めることのテスト"""
+        self._use_mock_client(monkeypatch)
+        self.rate_limited = gemini.GEMINI_MAX_RETRIES
+        with pytest.raises(GeminiEmbeddingError):
+            gemini.embed_contents_batch(["a"])
+        assert len(self.requests) == gemini.GEMINI_MAX_RETRIES
+
+    def test_embed_content_retries_rate_limit(self, monkeypatch):
+        """embedContent も 429 を再試行することのテスト"""
+        self._use_mock_client(monkeypatch)
+        self.rate_limited = 1
+        assert gemini.embed_content("a") == [3.0, 4.0]
+        assert len(self.requests) == 2
+
+if __name__ == "__main__":
+    pytest.main([__file__])
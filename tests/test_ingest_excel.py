@@ -0,0 +1,133 @@
+import pytest
+import sys
+import os
+from pathlib import Path
+
+import pandas as pd
+
+# バックエンドディレクトリをパスに追加
+sys.path.append(str(Path(__file__).parent.parent / "backend"))
+
+from ingest_excel import ExcelIngestor, fill_merged_cells
+
+def _reference_cell_data(df, row_meta, sheet_name):
+    """列方向にまとめる前の実装と同じ、行・セルごとのループによるセルデータ作成（updated_at を除く）"""
+    columns = list(df.columns)
+    cell_data_list = []
+    for position, (_, row) in enumerate(df.iterrows()):
+        excel_row_num = int(row["row_id"])
+        for col_idx, (col_name, value) in enumerate(zip(columns, row)):
+            str_value = str(value).strip()
+            if not str_value or str_value.lower() in ['nan', 'none', ''] or str(col_name).startswith('Unnamed:'):
+                continue
+            cell_data_list.append({
+                "row_id": f"{sheet_name}_row_{excel_row_num}_col_{col_idx}_{col_name.replace(' ', '_')}",
+                "company": row_meta["company"][position],
+                "lead_status": row_meta["lead_status"][position],
+                "sheet": sheet_name,
+                "excel_row": excel_row_num,
+                "column_index": col_idx,
+                "column_name": col_name,
+                "cell_value": str_value,
+                "structured_data": f"【行{excel_row_num}】企業名: {row_meta['company'][position]} | リードステータス: {row_meta['lead_status'][position]} | {col_name}: {str_value}",
+                "url": row_meta["url"][position],
+                "url_domain": row_meta["url_domain"][position],
+                "company_alias": row_meta["company_alias"][position],
+                "company_name_norm": row_meta["company_name_norm"][position],
+                "company_name_variants_str": row_meta["company_name_variants_str"][position],
+            })
+    return cell_data_list
+
+def _reference_merged_cells(df):
+    """ベクトル化する前の実装と同じ、行・セルごとのループによる H-L 列の前方埋め"""
+    h_col_idx = ord('H') - ord('A')
+    l_col_idx = ord('L') - ord('A')
+    for idx in df.index:
+        row = df.loc[idx].copy()
+        for i in range(1, len(row)):
+            if not str(row.iloc[i]).strip() or str(row.iloc[i]) == 'nan':
+                if str(row.iloc[i-1]).strip() and str(row.iloc[i-1]) != 'nan':
+                    if h_col_idx <= i-1 <= l_col_idx and h_col_idx <= i <= l_col_idx:
+                        row.iloc[i] = row.iloc[i-1]
+        df.loc[idx] = row
+    return df
+
+class TestMergedCells:
+    def setup_method(self):
+        """テスト前のセットアップ（A-N 列、読み込み時と同じく fillna("") 済みの文字列）"""
+        self.columns = [f"列{chr(ord('A') + i)}" for i in range(14)]
+        self.rows = [
+            ["企業A", "", "", "", "", "", "", "値H", "", "", "値K", "", "", ""],
+            ["企業B", "", "", "", "", "", "G", "", "", "値J", "  ", "nan", "M", ""],
+            ["企業C", "", "", "", "", "", "", "", "", "", "", "", "", ""],
+            ["企業D", "", "", "", "", "", "", "nan", "値I", "", "", "", "", ""],
+        ]
+
+    def test_matches_reference(self):
+        """H-L 列だけが左隣の値で埋まり、行ごとのループと同じ結果になることのテスト"""
+        df = pd.DataFrame(self.rows, columns=self.columns)
+        expected = _reference_merged_cells(df.copy())
+        inherited = fill_merged_cells(df)
+        pd.testing.assert_frame_equal(df, expected)
+        assert inherited == 8
+        # G 列の値は H 列へ継承しない、M 列は範囲外
+        assert df.iloc[1, 7] == ""
+        assert df.iloc[0, 12] == ""
+
+    def test_ingestor_and_rag_service_share_rule(self):
+        """ExcelIngestor の結合セル処理が共通の fill_merged_cells と同じ結果になることのテスト"""
+        ingestor = ExcelIngestor.__new__(ExcelIngestor)
+        df = pd.DataFrame(self.rows, columns=self.columns)
+        expected = df.copy()
+        fill_merged_cells(expected)
+        pd.testing.assert_frame_equal(ingestor._process_merged_cells_data(df), expected)
+
+    def test_narrow_sheet(self):
+        """H 列に満たないシートでは何もしないことのテスト"""
+        df = pd.DataFrame([["企業A", "", "値"]], columns=["列A", "列B", "列C"])
+        assert fill_merged_cells(df) == 0
+        assert df.iloc[0].tolist() == ["企業A", "", "値"]
+
+    def test_no_rows(self):
+        """データ行が無い場合のテスト"""
+        df = pd.DataFrame(columns=self.columns, dtype=object)
+        assert fill_merged_cells(df) == 0
+        assert df.empty
+
+class TestCreateCellData:
+    def setup_method(self):
+        """テスト前のセットアップ（API キーや Chroma を使わないよう __init__ は呼ばない）"""
+        self.ingestor = ExcelIngestor.__new__(ExcelIngestor)
+        self.df = pd.DataFrame({
+            "index": [0, 2, 5],
+            "company_name": ["テスト", "大阪商事", "https://example.co.jp"],
+            "代表電話": ["03-0000-0000", "  ", "nan"],
+            "Unnamed: 3": ["除外", "除外", "除外"],
+            "社内 メモ": [" 再架電 ", "None", ""],
+            "lead_status": ["アポ", "未設定", "NG"],
+            "row_id": [2, 4, 7],
+        })
+        self.row_meta = {
+            "company": ["テスト", "大阪商事", "example"],
+            "lead_status": ["アポ", "未設定", "NG"],
+            "url": ["", "", "https://example.co.jp"],
+            "url_domain": ["", "", "example.co.jp"],
+            "company_alias": ["", "", "example"],
+            "company_name_norm": ["テスト", "大阪商事", "example"],
+            "company_name_variants_str": ["テスト", "大阪商事", "example"],
+        }
+
+    def test_matches_reference(self):
+        """列方向にまとめた実装が行ごとのループと同じセルデータを同じ順で返すことのテスト"""
+        result = self.ingestor._create_cell_data(self.df, self.row_meta, "Sheet1")
+        expected = _reference_cell_data(self.df, self.row_meta, "Sheet1")
+        assert [{k: v for k, v in cell.items() if k != "updated_at"} for cell in result] == expected
+        assert all(cell["updated_at"] for cell in result)
+
+    def test_no_rows(self):
+        """行が無い場合は空リストを返すことのテスト"""
+        empty_meta = {key: [] for key in self.row_meta}
+        assert self.ingestor._create_cell_data(self.df.iloc[[]], empty_meta, "Sheet1") == []
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,69 @@
+import pytest
+import sys
+import os
+from pathlib import Path
+
+# バックエンドディレクトリをパスに追加
+sys.path.append(str(Path(__file__).parent.parent / "backend"))
+
+import rag_service
+from rag_service import RAGService
+
+class TestKeywordScores:
+    def setup_method(self):
+        """テスト前のセットアップ"""
+        self.texts = [
+            "企業名: 株式会社テスト | 所在地: 東京 | 社内メモ: テスト送付済み",
+            "企業名: 大阪商事 | 所在地: 大阪",
+            None,
+            "",
+            "テストテストテスト",
+            "aaaa",
+        ]
+        self.terms = ["テスト", "東京", "aa"]
+
+    def _expected_scores(self, texts, terms):
+        """検索語ごとの str.count（重ならない出現回数）の合計"""
+        return [sum((text or "").count(term) for term in terms) for text in texts]
+
+    def test_keyword_scores(self):
+        """検索語ごとの出現回数の合計がスコアになることのテスト"""
+        scores = RAGService._keyword_scores(self.texts, self.terms)
+        assert scores.tolist() == self._expected_scores(self.texts, self.terms)
+
+    def test_keyword_scores_with_automaton(self):
+        """Aho-Corasick 版が str.count と同じ結果になることのテスト"""
+        if rag_service.ahocorasick is None:
+            pytest.skip("pyahocorasick is not installed")
+        texts = self.texts + ["テストテ", "ststs", "東京テスト東京"]
+        terms = ["テスト", "テ", "sts", "東京テスト東京"]
+        scores = RAGService._keyword_scores(texts, terms)
+        assert scores.tolist() == self._expected_scores(texts, terms)
+
+    def test_keyword_scores_pandas_fallback(self, monkeypatch):
+        """pyahocorasick が無い場合の pandas 版も同じ結果になることのテスト"""
+        monkeypatch.setattr(rag_service, "ahocorasick", None)
+        texts = self.texts + ["テストテ", "ststs", "a.b", "a+b"]
+        terms = ["テスト", "テ", "sts", "a.b", "+"]
+        scores = RAGService._keyword_scores(texts, terms)
+        assert scores.tolist() == self._expected_scores(texts, terms)
+
+    def test_keyword_scores_pandas_fallback_no_match(self, monkeypatch):
+        """どの文書にも検索語が無い場合は全て0になることのテスト"""
+        monkeypatch.setattr(rag_service, "ahocorasick", None)
+        scores = RAGService._keyword_scores(self.texts, ["存在しない語"])
+        assert scores.tolist() == [0] * len(self.texts)
+
+    def test_keyword_scores_empty(self):
+        """検索語・文書が空の場合のテスト"""
+        assert RAGService._keyword_scores(self.texts, []).tolist() == [0] * len(self.texts)
+        assert RAGService._keyword_scores([], self.terms).tolist() == []
+
+    def test_keyword_terms(self):
+        """クエリ全体と区切り文字で分けた語が重複なく返ることのテスト"""
+        assert RAGService._keyword_terms("") == []
+        assert RAGService._keyword_terms("テスト") == ["テスト"]
+        assert RAGService._keyword_terms("東京、テスト 東京") == ["東京、テスト 東京", "東京", "テスト"]
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,54 @@
+import pytest
+import sys
+import os
+import asyncio
+from pathlib import Path
+
+from google.api_core import exceptions as google_exceptions
+
+# バックエンドディレクトリをパスに追加
+sys.path.append(str(Path(__file__).parent.parent / "backend"))
+
+from main import _is_retryable_llm_error
+
+def _raise_wrapped(error, cause):
+    """LangChain のように元の例外を __cause__ に持つ例外を返す"""
+    try:
+        raise error from cause
+    except Exception as e:
+        return e
+
+class TestRetryableLLMError:
+    def test_timeouts_are_retryable(self):
+        """タイムアウトはリトライ対象であることのテスト"""
+        assert _is_retryable_llm_error(TimeoutError())
+        assert _is_retryable_llm_error(asyncio.TimeoutError())
+
+    def test_retryable_status_codes(self):
+        """レート制限・サーバー側の一時的な障害はリトライ対象であることのテスト"""
+        assert _is_retryable_llm_error(google_exceptions.TooManyRequests("rate limited"))
+        assert _is_retryable_llm_error(google_exceptions.ResourceExhausted("quota"))
+        assert _is_retryable_llm_error(google_exceptions.InternalServerError("internal"))
+        assert _is_retryable_llm_error(google_exceptions.BadGateway("bad gateway"))
+        assert _is_retryable_llm_error(google_exceptions.ServiceUnavailable("unavailable"))
+        assert _is_retryable_llm_error(google_exceptions.GatewayTimeout("timeout"))
+
+    def test_client_errors_are_not_retryable(self):
+        """リクエスト自体の誤りはリトライしないことのテスト"""
+        assert not _is_retryable_llm_error(google_exceptions.InvalidArgument("bad request"))
+        assert not _is_retryable_llm_error(google_exceptions.PermissionDenied("forbidden"))
+        assert not _is_retryable_llm_error(google_exceptions.NotFound("no such model"))
+
+    def test_wrapped_errors(self):
+        """ラップされた例外は元の例外（__cause__）で判定することのテスト"""
+        assert _is_retryable_llm_error(_raise_wrapped(RuntimeError("LLM call failed"), google_exceptions.ResourceExhausted("quota")))
+        assert _is_retryable_llm_error(_raise_wrapped(ValueError("outer"), _raise_wrapped(RuntimeError("inner"), TimeoutError())))
+        assert not _is_retryable_llm_error(_raise_wrapped(RuntimeError("LLM call failed"), google_exceptions.InvalidArgument("bad request")))
+
+    def test_message_text_is_not_used(self):
+        """メッセージに 429 などが含まれていても型で判定することのテスト"""
+        assert not _is_retryable_llm_error(ValueError("429 Too Many Requests"))
+        assert not _is_retryable_llm_error(RuntimeError("503 Service Unavailable / timeout"))
+
+if __name__ == "__main__":
+    pytest.main([__file__])
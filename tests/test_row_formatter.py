@@ -0,0 +1,74 @@
+import pytest
+import sys
+import os
+from dataclasses import replace
+from pathlib import Path
+
+import pandas as pd
+
+# バックエンドディレクトリをパスに追加
+sys.path.append(str(Path(__file__).parent.parent / "backend"))
+
+from rag_service import RAGService, _compile_row_formatter
+
+def _reference_row_text(columns, values):
+    """生成前の実装と同じ、列ごとのループによる1行のテキスト化"""
+    row_data = []
+    for col, value in zip(columns, values):
+        str_value = str(value) if value is not None else ""
+        if str_value.strip() and str_value != 'nan' and str_value != col:
+            row_data.append(f"{col}: {str_value.strip()}")
+    return " | ".join(row_data)
+
+class TestRowFormatter:
+    def setup_method(self):
+        """テスト前のセットアップ"""
+        self.columns = ("企業名", "代表電話", "社内メモ", "従業員数")
+        self.rows = [
+            ("株式会社テスト", "03-0000-0000", "  再架電予定  ", "120"),
+            ("", "   ", "nan", "従業員数"),
+            ("企業名", "代表電話", "社内メモ", " nan "),
+            ("大阪商事", "", "", ""),
+        ]
+
+    def test_matches_reference(self):
+        """生成した関数が列ごとのループと同じテキストを返すことのテスト"""
+        row_to_text = _compile_row_formatter(self.columns)
+        for row in self.rows:
+            assert row_to_text(row) == _reference_row_text(self.columns, row)
+
+    def test_unusual_column_names(self):
+        """引用符・改行・波括弧などを含む列名でも安全に生成できることのテスト"""
+        columns = ("a'b", 'c"d', "e\nf", "{g}", "__import__('os')", "\\", 0)
+        row = ("1", "2", "3", "4", "5", "6", "7")
+        row_to_text = _compile_row_formatter(columns)
+        assert row_to_text(row) == _reference_row_text(columns, row)
+        # 列名と同じ値は除外される
+        same_as_column = tuple(str(c) if isinstance(c, str) else "0" for c in columns)
+        assert row_to_text(same_as_column) == _reference_row_text(columns, same_as_column)
+
+    def test_empty_columns(self):
+        """列が無い場合は空文字を返すことのテスト"""
+        assert _compile_row_formatter(())(()) == ""
+
+    def test_formatter_is_cached(self):
+        """同じ列構成では生成済みの関数を使い回すことのテスト"""
+        assert _compile_row_formatter(self.columns) is _compile_row_formatter(tuple(self.columns))
+
+    def test_dataframe_to_text(self):
+        """_dataframe_to_text が空行を除いて各行をテキスト化することのテスト"""
+        loader = RAGService._document_loader()
+        loader.config = replace(loader.config, SPREADSHEET_TEXT_COLUMNS_TUPLE=("企業名", "代表電話"))
+        columns = ["企業名", "代表電話", "対象外の列"]
+        df = pd.DataFrame(
+            [("株式会社テスト", "03-0000-0000", "x"), ("", "", "y"), ("大阪商事", "nan", "z")],
+            columns=columns,
+        )
+        use_columns = columns[:2]
+        expected = "\n".join(
+            text for text in (_reference_row_text(use_columns, row[:2]) for row in df.itertuples(index=False)) if text
+        )
+        assert loader._dataframe_to_text(df) == expected
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,50 @@
+import pytest
+import sys
+import os
+import types
+from pathlib import Path
+
+# バックエンドディレクトリをパスに追加
+sys.path.append(str(Path(__file__).parent.parent / "backend"))
+
+from utils import tokens
+
+class TestTokens:
+    def setup_method(self):
+        """テスト前のセットアップ"""
+        self.calls = []
+        tokens.get_encoding.cache_clear()
+
+    def teardown_method(self):
+        tokens.get_encoding.cache_clear()
+
+    def _fake_tiktoken(self, monkeypatch, get_encoding):
+        fake = types.ModuleType("tiktoken")
+        fake.get_encoding = get_encoding
+        monkeypatch.setitem(sys.modules, "tiktoken", fake)
+
+    def test_encoding_load_failure_falls_back_to_len(self, monkeypatch):
+        """BPE ファイルの取得に失敗しても例外を出さず文字数で近似することのテスト"""
+        def failing_get_encoding(name):
+            self.calls.append(name)
+            raise OSError("network is unreachable")
+
+        self._fake_tiktoken(monkeypatch, failing_get_encoding)
+        assert tokens.count_tokens("テキスト") == 4
+        assert tokens.truncate_tokens("テキスト", 2) == "テキ"
+        # 失敗結果もキャッシュされ、リクエストごとに再取得しない
+        assert self.calls == [tokens.ENCODING_NAME]
+
+    def test_missing_tiktoken_falls_back_to_len(self, monkeypatch):
+        """tiktoken が未インストールの場合に文字数で近似することのテスト"""
+        monkeypatch.setitem(sys.modules, "tiktoken", None)
+        assert tokens.count_tokens("abc") == 3
+        assert tokens.truncate_tokens("abc", 5) == "abc"
+
+    def test_empty_text(self):
+        """空文字・予算0の場合のテスト"""
+        assert tokens.count_tokens("") == 0
+        assert tokens.truncate_tokens("abc", 0) == ""
+
+if __name__ == "__main__":
+    pytest.main([__file__])
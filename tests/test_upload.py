@@ -0,0 +1,76 @@
+import pytest
+import sys
+import os
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+# バックエンドディレクトリをパスに追加
+sys.path.append(str(Path(__file__).parent.parent / "backend"))
+
+import main
+
+class TestUpload:
+    @pytest.fixture(autouse=True)
+    def setup_data_dir(self, tmp_path, monkeypatch):
+        """テスト前のセットアップ（保存先を一時ディレクトリに置き換え、起動処理は実行しない）"""
+        monkeypatch.setattr(main, "data_dir", tmp_path)
+        self.data_dir = tmp_path
+        self.client = TestClient(main.app)
+
+    def _upload(self, filename, content):
+        return self.client.post("/upload", files={"file": (filename, content, "text/csv")})
+
+    def test_upload_saves_file(self):
+        """一時ファイル経由で保存され、.part が残らないことのテスト"""
+        response = self._upload("leads.csv", "企業名,電話\nテスト,03-0000-0000\n".encode("utf-8"))
+        assert response.status_code == 200
+        assert response.json()["filename"] == "leads.csv"
+        assert (self.data_dir / "leads.csv").read_text(encoding="utf-8") == "企業名,電話\nテスト,03-0000-0000\n"
+        assert not (self.data_dir / "leads.csv.part").exists()
+
+    def test_large_upload(self):
+        """チャンクサイズを超える（ディスクに退避された）アップロードも同じ内容で保存されることのテスト"""
+        content = os.urandom(main.UPLOAD_CHUNK_SIZE * 3 + 123)
+        response = self._upload("large.csv", content)
+        assert response.status_code == 200
+        assert (self.data_dir / "large.csv").read_bytes() == content
+        assert not (self.data_dir / "large.csv.part").exists()
+
+    def test_upload_replaces_existing_file(self):
+        """既存ファイルが新しい内容で置き換えられることのテスト"""
+        (self.data_dir / "leads.csv").write_text("old", encoding="utf-8")
+        response = self._upload("leads.csv", b"new")
+        assert response.status_code == 200
+        assert (self.data_dir / "leads.csv").read_bytes() == b"new"
+
+    def test_empty_file(self):
+        """空ファイルは 400 になり、ファイルも .part も作られないことのテスト"""
+        response = self._upload("empty.csv", b"")
+        assert response.status_code == 400
+        assert response.json()["detail"] == "File is empty"
+        assert not (self.data_dir / "empty.csv").exists()
+        assert not (self.data_dir / "empty.csv.part").exists()
+
+    def test_unsupported_extension(self):
+        """許可されていない拡張子は 400 になることのテスト"""
+        response = self._upload("script.exe", b"data")
+        assert response.status_code == 400
+        assert not (self.data_dir / "script.exe").exists()
+
+    def test_failure_keeps_existing_file(self, monkeypatch):
+        """書き込み途中で失敗した場合、.part を削除して既存ファイルを壊さないことのテスト"""
+        (self.data_dir / "leads.csv").write_text("old", encoding="utf-8")
+
+        async def failing_save(file, dest):
+            dest.write_bytes(b"partial")
+            raise OSError("No space left on device")
+
+        monkeypatch.setattr(main, "_save_upload", failing_save)
+        response = self._upload("leads.csv", b"new")
+        assert response.status_code == 500
+        assert (self.data_dir / "leads.csv").read_text(encoding="utf-8") == "old"
+        assert not (self.data_dir / "leads.csv.part").exists()
+
+if __name__ == "__main__":
+    pytest.main([__file__])